@@ -1,8 +1,15 @@
 import dash
 from dash import Dash, html, dcc
 import dash_bootstrap_components as dbc
+import plotly.io as pio
+import response_cache
+
+# Dark theme for every page, set once: each assignment validates and copies the template
+pio.templates.default = "plotly_dark"
 
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.DARKLY])
+# Repeat callback requests are answered from stored, pre-compressed responses
+response_cache.install(app)
 
 
 # Define the navigation bar
@@ -0,0 +1,205 @@
+// --- file: assets/genesis_drilldown.js ---
+// Clientside drill-down for the Genesis electricity and gas pages.
+// The page layout carries the monthly overview (monthly-summary-store) and the server sends
+// the hourly totals of a month once it is opened (month-hours-store, see month_hours in
+// pages/dashboard-genesis.py). Everything below the monthly view is drawn from those: the
+// daily and hourly charts, their cards and the day stepping make no server requests, except
+// that stepping into another month asks for that month's hours.
+// Ids on the gas page carry a 'gas-' prefix, so they are matched by suffix.
+(function () {
+    const MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+                    'July', 'August', 'September', 'October', 'November', 'December'];
+    const WEEKDAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'];
+    const HIDDEN = {'display': 'none'};
+    const NAV_STYLE = {'display': 'flex', 'justifyContent': 'center', 'gap': '10px', 'margin': '20px'};
+    const TITLE = {'y': 0.9, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top',
+                   'font': {'family': 'Arial', 'size': 30, 'weight': 'bold'}};
+
+    // Base64 little-endian float64 (see pack in the page) to a Float64Array
+    const unpacked = new WeakMap();
+    function unpack(month, key) {
+        let arrays = unpacked.get(month);
+        if (!arrays) {
+            arrays = {};
+            unpacked.set(month, arrays);
+        }
+        if (!arrays[key]) {
+            const bytes = atob(month[key]);
+            const view = new DataView(new ArrayBuffer(bytes.length));
+            for (let i = 0; i < bytes.length; i++) {
+                view.setUint8(i, bytes.charCodeAt(i));
+            }
+            const values = new Float64Array(bytes.length / 8);
+            for (let i = 0; i < values.length; i++) {
+                values[i] = view.getFloat64(i * 8, true);
+            }
+            arrays[key] = values;
+        }
+        return arrays[key];
+    }
+
+    function sum(values, start, end) {
+        let total = 0;
+        for (let i = start; i < end; i++) {
+            total += values[i];
+        }
+        return total;
+    }
+
+    // Dates are 'YYYY-MM-DD' strings, handled in UTC so the browser's time zone can't shift them
+    function parseDate(text) {
+        const [year, month, day] = text.slice(0, 10).split('-').map(Number);
+        return new Date(Date.UTC(year, month - 1, day));
+    }
+
+    function formatDate(date) {
+        return date.toISOString().slice(0, 10);
+    }
+
+    function dayIndex(month, date) {
+        return Math.round((parseDate(date) - parseDate(month.start)) / 86400000);
+    }
+
+    function card(title, text, color) {
+        return {
+            namespace: 'dash_bootstrap_components', type: 'Col', props: {children: [{
+                namespace: 'dash_bootstrap_components', type: 'Card', props: {
+                    color: color, outline: true, className: 'text-center mx-2',
+                    children: {namespace: 'dash_bootstrap_components', type: 'CardBody', props: {children: [
+                        {namespace: 'dash_html_components', type: 'H6', props: {children: title, className: 'card-title'}},
+                        {namespace: 'dash_html_components', type: 'P', props: {children: text, className: 'card-text fs-4'}},
+                    ]}},
+                },
+            }]},
+        };
+    }
+
+    function cards(title, usage, dollars) {
+        return [
+            card('Total Usage', `${usage.toFixed(2)} kWh`, 'primary'),
+            card(`Summary for ${title}`, `$${dollars.toFixed(2)} NZD`, 'info'),
+        ];
+    }
+
+    function message(text, template) {
+        return {data: [], layout: {template: template, title: {text: text},
+                                   xaxis: {visible: false}, yaxis: {visible: false}}};
+    }
+
+    function barFigure(title, template, color, x, y, hovertemplate, xTitle, yMax) {
+        return {
+            data: [{type: 'bar', name: 'Usage (kWh)', x: x, y: y, marker: {color: color},
+                    legendgroup: '1', hovertemplate: hovertemplate}],
+            layout: {
+                template: template, barmode: 'group', title: Object.assign({text: title}, TITLE),
+                xaxis: {title: {text: xTitle}}, yaxis: {title: {text: 'Total (kWh)'}, range: [0, yMax]},
+                legend: {title: {text: 'Metric'}},
+            },
+        };
+    }
+
+    function monthMatches(month, year, monthName) {
+        return month && month.year === year && month.month === monthName;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        genesis: {
+            render: function (activeTab, yearData, monthData, dateData, month, summary) {
+                const noUpdate = window.dash_clientside.no_update;
+                const template = summary.figure.layout.template;
+                const year = yearData && yearData.year ? yearData.year : 2025;
+                const monthName = monthData && monthData.month;
+                const date = dateData && dateData.date;
+
+                if (activeTab.endsWith('monthly-tab')) {
+                    const figure = Object.assign({}, summary.figure, {
+                        layout: Object.assign({}, summary.figure.layout, {
+                            title: Object.assign({}, summary.figure.layout.title, {text: `${year}`}),
+                        }),
+                    });
+                    return [figure, cards(`${year}`, summary.usage, summary.dollars), HIDDEN];
+                }
+
+                if (activeTab.endsWith('daily-tab')) {
+                    if (!(yearData && yearData.year && monthName)) {
+                        return [message("Please select a year from the 'Monthly View' to see daily totals.", template), [], HIDDEN];
+                    }
+                    if (!monthMatches(month, year, monthName)) {
+                        // The month's hours are on their way
+                        return [noUpdate, noUpdate, noUpdate];
+                    }
+                    const usage = unpack(month, 'usage');
+                    const dollars = unpack(month, 'dollars');
+                    const days = [], daily = [];
+                    const start = parseDate(month.start);
+                    for (let day = 0; day < month.days; day++) {
+                        days.push(formatDate(new Date(start.getTime() + day * 86400000)));
+                        daily.push(sum(usage, day * 24, day * 24 + 24));
+                    }
+                    const title = `${monthName} ${year}`;
+                    return [
+                        barFigure(title, template, month.color, days, daily,
+                                  '<b>Date:</b> %{x|%Y-%m-%d}<br><b>Usage:</b> %{y:.2f} kWh<extra></extra>',
+                                  'Date', month.max_daily),
+                        cards(title, sum(usage, 0, usage.length), sum(dollars, 0, dollars.length)),
+                        HIDDEN,
+                    ];
+                }
+
+                if (!date) {
+                    return [message("Please select a day from the 'Daily View' to see hourly totals.", template), [], HIDDEN];
+                }
+                const day = parseDate(date);
+                if (!monthMatches(month, day.getUTCFullYear(), MONTHS[day.getUTCMonth()])) {
+                    return [noUpdate, noUpdate, noUpdate];
+                }
+                const first = dayIndex(month, date) * 24;
+                const hourly = Array.from(unpack(month, 'usage').subarray(first, first + 24));
+                const hours = Array.from({length: 24}, (_, hour) => hour);
+                const title = `${WEEKDAYS[day.getUTCDay()]} ${String(day.getUTCDate()).padStart(2, '0')} ` +
+                              `${MONTHS[day.getUTCMonth()].slice(0, 3)} ${day.getUTCFullYear()}`;
+                return [
+                    barFigure(title, template, month.color, hours, hourly,
+                              '<b>Hour:</b> %{x}:00<br><b>Usage:</b> %{y:.2f} kWh<extra></extra>',
+                              'Hour of Day', month.max_hourly),
+                    cards(title, sum(hourly, 0, 24), sum(unpack(month, 'dollars'), first, first + 24)),
+                    NAV_STYLE,
+                ];
+            },
+
+            drilldown: function (clickData, prevClicks, nextClicks, activeTab, yearData, monthData, dateData) {
+                const noUpdate = window.dash_clientside.no_update;
+                const triggered = window.dash_clientside.callback_context.triggered;
+                const trigger = triggered.length ? triggered[0].prop_id.split('.')[0] : '';
+                // '' on the electricity page, 'gas-' on the gas page
+                const prefix = activeTab.replace(/(monthly|daily|hourly)-tab$/, '');
+
+                if (trigger.endsWith('usage-graph') && clickData) {
+                    const point = clickData.points[0];
+                    if (activeTab.endsWith('monthly-tab')) {
+                        // customdata is [year, month_name] for each monthly bar
+                        const customdata = point.customdata;
+                        if (!Array.isArray(customdata) || customdata.length < 1) {
+                            console.warn('Clicked monthly bar has missing or malformed customdata. Not drilling down.', point);
+                            return [noUpdate, noUpdate, noUpdate, noUpdate];
+                        }
+                        return [{'year': parseInt(customdata[0], 10)}, {'month': point.x}, {}, prefix + 'daily-tab'];
+                    }
+                    if (activeTab.endsWith('daily-tab')) {
+                        return [noUpdate, noUpdate, {'date': String(point.x).slice(0, 10)}, prefix + 'hourly-tab'];
+                    }
+                } else if ((trigger.endsWith('prev-day') || trigger.endsWith('next-day')) && dateData && dateData.date) {
+                    const step = trigger.endsWith('prev-day') ? -1 : 1;
+                    const day = new Date(parseDate(dateData.date).getTime() + step * 86400000);
+                    const year = day.getUTCFullYear(), monthName = MONTHS[day.getUTCMonth()];
+                    // Stores are only set when they change: setting one, even to the same value, would
+                    // make the server ship the month again. Crossing into another month does that.
+                    return [yearData && yearData.year === year ? noUpdate : {'year': year},
+                            monthData && monthData.month === monthName ? noUpdate : {'month': monthName},
+                            {'date': formatDate(day)}, noUpdate];
+                }
+                return [noUpdate, noUpdate, noUpdate, noUpdate];
+            },
+        },
+    });
+})();
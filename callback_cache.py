@@ -0,0 +1,115 @@
+# --- file: callback_cache.py ---
+# Memoization for Dash callbacks that depend only on their inputs and the dashboard data.
+# Results are keyed on the callback arguments plus data_registry.data_version(), so a reload
+# after an ingest invalidates them. Each callback keeps at most max_entries results, and the
+# results of all memoized callbacks share one budget of CALLBACK_CACHE_MB of JSON, beyond
+# which the least recently used ones (of whichever callback) are evicted.
+#
+#   @callback(Output(...), Input('slct_month', 'value'))
+#   @memoize()
+#   def update_dashboard(selected_month): ...
+#
+# Callbacks that read dash.ctx or State they don't take as arguments must not be memoized.
+import functools
+import json
+import os
+import threading
+from collections import OrderedDict
+from plotly.io.json import to_json_plotly
+import data_registry
+
+CALLBACK_CACHE_MB = float(os.environ.get('CALLBACK_CACHE_MB', 64))
+
+# (id of a callback's keys, key) -> (result, size, that callback's keys), least recently used
+# first, for every memoized callback
+_ENTRIES = OrderedDict()
+_CALLBACK_KEYS = []  # per callback: OrderedDict of its keys, least recently used first
+_LOCK = threading.Lock()
+_STATS = {'bytes': 0, 'version': None}
+
+
+def result_size(result):
+    """Size in bytes of a callback result as Dash would send it."""
+    return len(to_json_plotly(result))
+
+
+def _evict(keys, key):
+    _, size, _ = _ENTRIES.pop((id(keys), key))
+    del keys[key]
+    _STATS['bytes'] -= size
+
+
+def _clear():
+    _ENTRIES.clear()
+    for keys in _CALLBACK_KEYS:
+        keys.clear()
+    _STATS['bytes'] = 0
+
+
+def memoize(max_entries=32):
+    """
+    Cache a callback's results per argument values and data version.
+
+    Args:
+        max_entries (int): Results kept before the least recently used is dropped. Results
+            larger than the shared CALLBACK_CACHE_MB budget are returned but not kept.
+    """
+    max_bytes = int(CALLBACK_CACHE_MB * 2**20)
+
+    def decorate(func):
+        keys = OrderedDict()
+        stats = {'hits': 0, 'misses': 0}
+        with _LOCK:
+            _CALLBACK_KEYS.append(keys)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            version = data_registry.data_version()
+            key = json.dumps(args, sort_keys=True, default=str)
+            with _LOCK:
+                if version != _STATS['version']:
+                    # New data: nothing cached so far can be served again
+                    _clear()
+                    _STATS['version'] = version
+                if key in keys:
+                    keys.move_to_end(key)
+                    _ENTRIES.move_to_end((id(keys), key))
+                    stats['hits'] += 1
+                    return _ENTRIES[(id(keys), key)][0]
+                stats['misses'] += 1
+
+            result = func(*args)
+            size = result_size(result)
+            with _LOCK:
+                # Skip the result if the data moved on while it was computed
+                if size <= max_bytes and _STATS['version'] == version and key not in keys:
+                    keys[key] = None
+                    _ENTRIES[(id(keys), key)] = (result, size, keys)
+                    _STATS['bytes'] += size
+                    if len(keys) > max_entries:
+                        _evict(keys, next(iter(keys)))
+                    while _STATS['bytes'] > max_bytes:
+                        (_, oldest), (_, _, owner) = next(iter(_ENTRIES.items()))
+                        _evict(owner, oldest)
+            return result
+
+        def cache_info():
+            with _LOCK:
+                return {'hits': stats['hits'], 'misses': stats['misses'], 'entries': len(keys),
+                        'bytes': sum(_ENTRIES[(id(keys), key)][1] for key in keys)}
+
+        def cache_clear():
+            with _LOCK:
+                for key in list(keys):
+                    _evict(keys, key)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorate
+
+
+def cache_info():
+    """Entries and bytes held by all memoized callbacks together."""
+    with _LOCK:
+        return {'entries': len(_ENTRIES), 'bytes': _STATS['bytes'], 'max_bytes': int(CALLBACK_CACHE_MB * 2**20)}
@@ -0,0 +1,231 @@
+# --- file: data_registry.py ---
+# Process-wide registry of the data the dashboard pages use.
+# Each dataset is loaded once per web worker and shared by every page; derived views are
+# built from datasets (or other views) on first use and cached. Callers get a shallow copy,
+# so adding, dropping or renaming columns stays local to the caller, but the values are
+# shared and must not be modified in place. Datasets that aren't frames (e.g. the forecast
+# dict) are returned as is and must not be modified either.
+#
+#   register_view('gas_daily', lambda gas: gas.groupby(...).sum(), ['gas'])
+#   df = data_registry.get('gas_daily')
+#
+# Hot reload: every frame belongs to a state tagged with the generations of the stores it
+# was read from. At most every RELOAD_SECONDS a request checks those generations; when a
+# store has moved on, a background thread loads a new state (rebuilding the frames that were
+# in use, reusing those of unchanged stores) and swaps it in with a single assignment.
+# Requests keep being answered from the previous state meanwhile, and frames() hands out
+# several frames from one state, so a callback never mixes old and new data.
+import os
+import threading
+import time
+import pandas as pd
+from data_utils import (PARQUET_FILE, TEMPERATURE_ROLLUPS, TEMPERATURE_STORE, USAGE_SOURCES,
+                        read_temperature_rollup, read_usage)
+from usage_cube import build_cube, build_weekday_tensor, update_cube
+from usage_store import current_generation, load_snapshot
+
+RELOAD_SECONDS = float(os.environ.get('DASHBOARD_RELOAD_SECONDS', 30))
+
+# name -> (builder, [names of the datasets or views it is built from], [store paths it reads],
+#          update function or None)
+_SOURCES = {}
+_STATE = None
+_STATE_GUARD = threading.Lock()
+_RELOADING = threading.Lock()
+_LAST_POLL = 0.0
+
+
+def register_dataset(name, loader, stores=(), update=None):
+    """
+    Register a dataset loaded by loader() on first use. stores lists the store folders (or
+    single-file stores) it reads; the dataset is reloaded when one of them changes, by
+    update(previous value) if given, else by loader().
+    """
+    _SOURCES[name] = (loader, [], list(stores), update)
+
+
+def register_view(name, builder, deps, update=None):
+    """
+    Register a view built by builder(*frames of deps) on first use. The frames passed to
+    builder are shared; builder must return a new frame rather than modify them. On a reload
+    the view is rebuilt by update(previous value, *frames of deps) if given.
+    """
+    _SOURCES[name] = (builder, list(deps), [], update)
+
+
+def store_version(path):
+    """Committed generation of a store, or the modification time of a single-file store."""
+    if os.path.isdir(path):
+        return current_generation(path)
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _stores(name):
+    _, deps, stores, _ = _SOURCES[name]
+    return set(stores).union(*[_stores(dep) for dep in deps])
+
+
+def _store_versions():
+    paths = set().union(*[stores for _, _, stores, _ in _SOURCES.values()])
+    return {path: store_version(path) for path in paths}
+
+
+def _new_state(versions):
+    return {'versions': versions, 'frames': {}, 'locks': {}, 'guard': threading.Lock()}
+
+
+def _current_state():
+    global _STATE
+    if _STATE is None:
+        with _STATE_GUARD:
+            if _STATE is None:
+                _STATE = _new_state(_store_versions())
+    return _STATE
+
+
+def _build(state, name, previous=None):
+    # previous: the frames of the state being replaced, for views that update incrementally
+    frames = state['frames']
+    if name in frames:
+        return frames[name]
+    if name not in _SOURCES:
+        raise KeyError(f"Nothing registered as {name!r}")
+    # One lock per name: a view is built once even if several callbacks ask for it together,
+    # while unrelated views can build in parallel
+    with state['guard']:
+        lock = state['locks'].setdefault(name, threading.Lock())
+    with lock:
+        if name not in frames:
+            builder, deps, _, update = _SOURCES[name]
+            args = [_build(state, dep, previous) for dep in deps]
+            if update is not None and previous and name in previous:
+                frames[name] = update(previous[name], *args)
+            else:
+                frames[name] = builder(*args)
+    return frames[name]
+
+
+def _reload(old, versions):
+    global _STATE
+    try:
+        changed = {path for path, version in versions.items() if old['versions'].get(path) != version}
+        state = _new_state(versions)
+        # Frames of unchanged stores are shared with the old state
+        for name, frame in list(old['frames'].items()):
+            if not changed & _stores(name):
+                state['frames'][name] = frame
+        # Rebuild everything in use before the swap, so no request waits for the new data
+        previous = dict(old['frames'])
+        for name in previous:
+            _build(state, name, previous)
+        _STATE = state
+        print(f" + Reloaded dashboard data from {', '.join(sorted(changed))}")
+    except Exception as err:
+        print(f" + Dashboard data reload failed, still serving the previous data: {err}")
+    finally:
+        _RELOADING.release()
+
+
+def _poll():
+    global _LAST_POLL
+    if time.monotonic() - _LAST_POLL < RELOAD_SECONDS or not _RELOADING.acquire(blocking=False):
+        return
+    _LAST_POLL = time.monotonic()
+    state = _current_state()
+    versions = _store_versions()
+    if versions == state['versions']:
+        _RELOADING.release()
+        return
+    threading.Thread(target=_reload, args=(state, versions), daemon=True).start()
+
+
+def _shared(value):
+    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+
+def get(name):
+    """
+    Return the dataset or view registered as name, loading or building it on first use.
+
+    Raises:
+        FileNotFoundError: If the store behind a dataset has no data yet.
+    """
+    return frames(name)[0]
+
+
+def frames(*names):
+    """Return the frames registered as names, all taken from the same data generation."""
+    _poll()
+    state = _current_state()
+    return tuple(_shared(_build(state, name)) for name in names)
+
+
+def data_version():
+    """
+    Token naming the store generations (or file times) behind the data being served. It
+    changes when a reload is swapped in, so results cached under it go stale with the data.
+    """
+    _poll()
+    return tuple(sorted(_current_state()['versions'].items()))
+
+
+def registered():
+    """Names of the registered datasets, then of the views built from them."""
+    return sorted(_SOURCES, key=lambda name: (bool(_SOURCES[name][1]), name))
+
+
+def reload():
+    """Load a new state from the stores now, waiting for any reload in progress."""
+    global _STATE
+    with _RELOADING:
+        _STATE = _new_state(_store_versions())
+
+
+def load_usage(source):
+    """
+    Read the current generation of a usage store, noting its partition files in
+    df.attrs['partitions'] (None for a legacy single-file store).
+    """
+    store = USAGE_SOURCES[source]['store']
+    # Pinned, so the rows and the partition list describe the same commit
+    generation = current_generation(store)
+    df = read_usage(source, derived=('dollars',), generation=generation)
+    df.attrs['partitions'] = load_snapshot(store, generation)['partitions'] if generation is not None else None
+    return df
+
+
+def update_usage(source, previous):
+    """Bring a frame from load_usage up to date, reading only the months that changed."""
+    store = USAGE_SOURCES[source]['store']
+    generation = current_generation(store)
+    before = previous.attrs.get('partitions')
+    if generation is None or before is None:
+        return load_usage(source)
+    after = load_snapshot(store, generation)['partitions']
+    changed = pd.PeriodIndex(sorted(k for k in set(before) | set(after) if before.get(k) != after.get(k)), freq='M')
+    if changed.empty:
+        return previous
+    start, end = changed.min().start_time, changed.max().end_time
+    keep = previous[(previous['index'] < start) | (previous['index'] > end)]
+    if any(key in after for key in changed.strftime('%Y-%m')):
+        fresh = read_usage(source, start=start, end=end, derived=('dollars',), generation=generation)
+        keep = pd.concat([keep, fresh], ignore_index=True)
+    df = keep.sort_values('index', ignore_index=True)
+    df['type'] = df['type'].astype('category')
+    df.attrs['partitions'] = after
+    return df
+
+
+for _source, _config in USAGE_SOURCES.items():
+    register_dataset(_source, lambda source=_source: load_usage(source),
+                     [_config['store'], _config['legacy_path']],
+                     update=lambda previous, source=_source: update_usage(source, previous))
+    register_view(f'{_source}_weekdays', build_weekday_tensor, [_source])
+    register_view(f'{_source}_cube', build_cube, [_source], update=update_cube)
+for _name, (_store, _) in TEMPERATURE_ROLLUPS.items():
+    # Until the first refresh builds a rollup it is computed from the raw readings
+    register_dataset(f'temperature_{_name}', lambda name=_name: read_temperature_rollup(name),
+                     [_store, TEMPERATURE_STORE, PARQUET_FILE])
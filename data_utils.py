@@ -4,22 +4,44 @@ import glob
 import re
 import json
 import datetime
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import calendar
-from hilltoppy import Hilltop
+from concurrent.futures import ProcessPoolExecutor
+from downsample import MAX_POINTS
+from hilltop_fetch import fetch_range, clear_checkpoints
+from manifest import (manifest_key, migrate_processed_list, find_new_files,
+                      record_files, file_digest)
+from usage_schema import to_compact, to_legacy, with_derived_fields
+from usage_store import (partition_keys, partitions_between, list_partitions,
+                         read_partitions, write_partitions, read_store,
+                         migrate_legacy_file, load_snapshot, writer_lock)
 
 # Configuration
+# Legacy single-file temperature store, migrated into TEMPERATURE_STORE on the next refresh
 PARQUET_FILE = 'air_temperature.parquet'
-BASE_URL = 'https://extranet.trc.govt.nz/getdata/'
+TEMPERATURE_STORE = 'air_temperature'
+TEMPERATURE_KEY = ['SiteName', 'MeasurementName', 'Time']
+# Rollup name -> (store, period). Periods start on the same hour grid as the usage stores.
+TEMPERATURE_ROLLUPS = {'hourly': ('air_temperature_hourly', 'h'), 'daily': ('air_temperature_daily', 'D')}
+# HILLTOP_URL points the fetch elsewhere, e.g. at hilltop_stub.py for offline runs
+BASE_URL = os.environ.get('HILLTOP_URL', 'https://extranet.trc.govt.nz/getdata/')
 HTS = 'boo.hts'
 SITE = 'Patea at Stratford'
 MEASUREMENT = 'Air Temperature (Continuous)'
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Air temperature is fetched in windows of this length, this many at a time; completed
+# windows are kept in the checkpoint folder until the data has been saved
+FETCH_WINDOW = timedelta(days=7)
+HILLTOP_WORKERS = int(os.environ.get('HILLTOP_WORKERS', 4))
+FETCH_CHECKPOINT_DIR = "air_temperature_fetch"
+# Legacy single-file stores, migrated into the partitioned stores below on the next ingest
 STORE_PATH = "electricity_usage.parquet"
 STORE_PATH_GAS = "gas_usage.parquet"
+STORE_DIR = "electricity_usage"
+STORE_DIR_GAS = "gas_usage"
 STORE_BILLING = "billing_periods.csv"
 METADATA_PATH = "metadata.json"
 folder_path = "/Users/shodges/scripts/energy_consumption/data"
@@ -29,6 +51,13 @@ else:
     DOWNLOADS_FOLDER = "/home/Catnipmadness/scripts/energy_consumption/data"
 FILE_PATTERN_ELECTRICITY = os.path.join(DOWNLOADS_FOLDER, 'Genesis Energy - My Hourly Usage*.csv')
 FILE_PATTERN_GAS = os.path.join(DOWNLOADS_FOLDER, 'Genesis Energy - Hourly Gas Usage*.csv')
+# Processes used to parse new CSV files; 1 keeps ingestion serial
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 1))
+
+USAGE_SOURCES = {
+    'electricity': {'store': STORE_DIR, 'legacy_path': STORE_PATH, 'pattern': FILE_PATTERN_ELECTRICITY},
+    'gas': {'store': STORE_DIR_GAS, 'legacy_path': STORE_PATH_GAS, 'pattern': FILE_PATTERN_GAS},
+}
 
 
 def check_forecast_electricty_data():
@@ -94,122 +123,130 @@ def check_forecast_electricty_data():
     # This function is a placeholder for future implementation
     # In a real implementation, you would fetch and process forecast data here.
 
-def check_electricity_data():
-    print(" + Checking electricity data...")
-    # Load metadata and discover new files
-    metadata = load_metadata()
-    new_electricity_files = discover_new_electricity_files(metadata)
-
-    if not new_electricity_files:
-        print("   - No new electricity files to process.")
-        if os.path.exists(STORE_PATH):
-            df = pd.read_parquet(STORE_PATH)
-        else:
-            df = pd.DataFrame()
-    else:
-        print(f"   - Processing {len(new_electricity_files)} new electricity files.")
-        last_dt = metadata.get("last_datetime_electricity")
-        new_df = read_and_filter(new_electricity_files, last_dt)
-
-        if not new_df.empty:
-            new_df = enrich_datetime_info(new_df)
-            new_df = assign_dayparts(new_df)
-            new_df = assign_billMonths(new_df)
-            new_df = clean_usage_data(new_df)
-
-            # Merge with previous data if exists
-            if os.path.exists(STORE_PATH):
-                old_df = pd.read_parquet(STORE_PATH)
-                df = pd.concat([old_df, new_df], ignore_index=True)
-            else:
-                df = new_df
-
-            df.sort_values(by='index', ascending=True, inplace=True)
-                        
-            # Assign bill months as a last step as it needs to be done after all data is merged
-            # as every month needs to be updated based on the number of billing days represented
-            # in the most current month. It also acknowledges that billing days gets reset every month.
-            df = assign_billMonths(df)            
-
-
-            df.to_parquet(STORE_PATH, index=False)
-            metadata["processed_files_electricity"].extend(new_electricity_files)
-            #df.to_csv("new_data.csv", index=False)
-            metadata["last_datetime_electricity"] = df["index"].max().strftime("%Y-%m-%dT%H:%M:%S")
-            save_metadata(metadata)
-        else:
-            print("   - No new data rows found in the new files.")
-            if os.path.exists(STORE_PATH):
-                df = pd.read_parquet(STORE_PATH)
-            else:
-                df = pd.DataFrame()
-    return df
+def check_usage_data(source, workers=None, executor=None):
+    """
+    Ingest new Genesis files for a usage source ('electricity' or 'gas') into its
+    partitioned store and return the full history. executor is an optional process pool
+    to parse the files in, e.g. one shared by several sources.
+    """
+    config = USAGE_SOURCES[source]
+    print(f" + Checking {source} data...")
+    # Ingests of the same source take turns; readers keep serving the last commit meanwhile
+    with writer_lock(config['store']):
+        committed = _ingest_usage(source, workers, executor)
+    return _stored_usage(source) if committed is None else committed
 
 
-def check_gas_data():
-    print(" + Checking gas data...")
+def _ingest_usage(source, workers, executor=None):
+    config = USAGE_SOURCES[source]
+    migrate_legacy_file(config['legacy_path'], config['store'])
     # Load metadata and discover new files
-    metadata = load_metadata()
-    new_gas_files = discover_new_gas_files(metadata)
-
-    if not new_gas_files:
-        print("   - No new gas files to process.")
-        if os.path.exists(STORE_PATH_GAS):
-            df = pd.read_parquet(STORE_PATH_GAS)
-        else:
-            df = pd.DataFrame()
+    metadata = load_metadata(source)
+    new_entries, refreshed = discover_new_files(metadata, source)
+    new_files = [path for path, _ in new_entries]
+    record_files(metadata[manifest_key(source)], refreshed)
+
+    if not new_files:
+        print(f"   - No new {source} files to process.")
+        if refreshed:
+            # Commit the updated entries alone, so these files aren't hashed again next run
+            write_partitions(pd.DataFrame({'index': pd.to_datetime([])}), config['store'], [], metadata=metadata)
+        return None
+
+    print(f"   - Processing {len(new_files)} new {source} files.")
+    # Every row is read: a re-issued file may correct hours that are already stored
+    new_df = read_and_filter(new_files, workers=workers, executor=executor)
+
+    if new_df.empty:
+        print("   - No new data rows found in the new files.")
+        return None
+
+    # Calendar fields and dayparts are derived on read, so only the readings are kept
+    new_df = clean_usage_data(new_df).rename(columns={'datetime': 'index'})
+    new_df = to_compact(new_df)
+
+    # Bill months depend on how many days the current billing period holds, so adding a day
+    # moves every period's window. Only the months overlapping those moves (plus the months
+    # holding new rows) are read, relabelled and rewritten; a changed billing_periods.csv
+    # relabels everything.
+    store = config['store']
+    old_max = metadata.get(f"last_datetime_{source}")
+    new_max = new_df['index'].max() if old_max is None else max(pd.Timestamp(old_max), new_df['index'].max())
+    billing_hash = file_digest(billing_periods_path())
+    touched = set(partition_keys(new_df['index']))
+    relabel = set()
+    if old_max is None or metadata.get(f"billing_hash_{source}") != billing_hash:
+        relabel.update(list_partitions(store))
     else:
-        print(f"   - Processing {len(new_gas_files)} new gas files.")
-        last_dt = metadata.get("last_datetime_gas")
-        new_df = read_and_filter(new_gas_files, last_dt)
-
-        if not new_df.empty:
-            new_df = enrich_datetime_info(new_df)
-            new_df = assign_dayparts(new_df)
-            new_df = assign_billMonths(new_df)
-            new_df = clean_usage_data(new_df)
-
-            # Merge with previous data if exists
-            if os.path.exists(STORE_PATH_GAS):
-                old_df = pd.read_parquet(STORE_PATH_GAS)
-                df = pd.concat([old_df, new_df], ignore_index=True)
-            else:
-                df = new_df
-
-            df.sort_values(by='index', ascending=True, inplace=True)
-            
-            # Assign bill months as a last step as it needs to be done after all data is merged
-            # as every month needs to be updated based on the number of billing days represented
-            # in the most current month. It also acknowledges that billing days gets reset every month.
-            df = assign_billMonths(df)
-            
-            df.to_parquet(STORE_PATH_GAS, index=False)
-            metadata["processed_files_gas"].extend(new_gas_files)
-            #df.to_csv("new_data.csv", index=False)
-            metadata["last_datetime_gas"] = df["index"].max().strftime("%Y-%m-%dT%H:%M:%S")
-            save_metadata(metadata)
-        else:
-            print("   - No new data rows found in the new files.")
-            if os.path.exists(STORE_PATH_GAS):
-                df = pd.read_parquet(STORE_PATH_GAS)
-            else:
-                df = pd.DataFrame()
-    # plot_summary(df, plot_type="monthly_totals")
-    return df
+        for lo, hi in changed_bill_windows(old_max, new_max):
+            relabel.update(partitions_between(lo, hi))
+
+    # Upsert the readings into the months they fall in; only months whose rows actually
+    # changed are rewritten, besides those needing new bill months
+    old_df = read_partitions(store, touched | relabel)
+    if old_df.empty:
+        df, changed = upsert_readings(new_df.iloc[:0], new_df)
+    else:
+        df, changed = upsert_readings(to_compact(old_df).sort_values('index', kind='stable'), new_df)
+    changed_keys = set(partition_keys(changed))
+    print(f"   - {len(changed)} readings added or revised.")
+
+    # Assign bill months as a last step as it needs to be done after all data is merged
+    # as every month needs to be updated based on the number of billing days represented
+    # in the most current month. It also acknowledges that billing days gets reset every month.
+    df = assign_billMonths(df, max_day=new_max)
+
+    # The manifest is committed in the same generation as the rows it describes
+    record_files(metadata[manifest_key(source)], new_entries)
+    metadata[f"last_datetime_{source}"] = new_max.strftime("%Y-%m-%dT%H:%M:%S")
+    metadata[f"billing_hash_{source}"] = billing_hash
+    rewrite = changed_keys | relabel
+    generation = write_partitions(to_compact(df), store, rewrite, metadata=metadata)
+    print(f"   - Rewrote {len(rewrite)} monthly partitions (generation {generation}).")
+    return to_legacy(read_usage(source, derived=()), DAYPART_SCHEMES)
+
+
+def _stored_usage(source):
+    try:
+        return to_legacy(read_usage(source, derived=()), DAYPART_SCHEMES)
+    except FileNotFoundError:
+        return pd.DataFrame()
+
+
+def check_electricity_data(workers=None):
+    return check_usage_data('electricity', workers=workers)
+
+
+def check_gas_data(workers=None):
+    return check_usage_data('gas', workers=workers)
+
+
+def read_usage(source, start=None, end=None, derived=('dollars',), generation=None):
+    """
+    Read usage rows for 'electricity' or 'gas' between start and end from the partitioned
+    store, falling back to the legacy single Parquet file.
+
+    Rows come back in the compact schema (index, usage, cents, type, billMonth) plus the
+    derived fields requested, e.g. derived=('dollars', 'YYYYMMDD', 'd_time1'). Use
+    usage_schema.to_legacy for the full column layout of the original files. generation
+    reads an earlier retained ingest batch instead of the current one.
+
+    Raises:
+        FileNotFoundError: If no data has been stored for the source.
+    """
+    config = USAGE_SOURCES[source]
+    df = read_store(config['store'], start=start, end=end, legacy_path=config['legacy_path'],
+                    generation=generation)
+    df = to_compact(df)
+    return with_derived_fields(df, derived, DAYPART_SCHEMES)
 
 
 def check_air_temperature_data():
     print(" + Checking air temperature data...")
-    # Initialise Hilltop connection
-    ht = Hilltop(BASE_URL, HTS)
-
-    # Load existing air temperature data if available
-    if os.path.exists(PARQUET_FILE):
-        df_existing = pd.read_parquet(PARQUET_FILE)
-        df_existing['Time'] = pd.to_datetime(df_existing['Time'])
-        latest_time = df_existing['Time'].max()
-    else:
-        df_existing = pd.DataFrame()
+    migrate_legacy_file(PARQUET_FILE, TEMPERATURE_STORE, time_col='Time')
+    refresh_temperature_rollups()
+    latest_time = latest_air_temperature_time()
+    if latest_time is None:
         latest_time = datetime(2025, 1, 1)  # Default starting point
 
     # Check if air temperature data is more than 1 days old
@@ -220,60 +257,262 @@ def check_air_temperature_data():
 
         print(f"   - Fetching new data from {from_date} to {to_date}...")
 
-        # Fetch new data
-        df_new = ht.get_data(SITE, MEASUREMENT, from_date=from_date, to_date=to_date)
-
-        # Convert Time to datetime
-        df_new['Time'] = pd.to_datetime(df_new['Time'])
-
-        # Combine and deduplicate
-        df_combined = pd.concat([df_existing, df_new])
-        df_combined = df_combined.drop_duplicates(subset=['SiteName', 'MeasurementName', 'Time'])
-
-        # Save updated data
-        df_combined.to_parquet(PARQUET_FILE, index=False)
-        print("   - Air temperature data updated and saved to Parquet.")
+        # Fetch new data; a failed run resumes from its checkpointed windows
+        df_new = fetch_range(BASE_URL, HTS, SITE, MEASUREMENT, from_date, to_date, window=FETCH_WINDOW,
+                             workers=HILLTOP_WORKERS, checkpoint_dir=FETCH_CHECKPOINT_DIR)
+        appended = append_air_temperature(df_new)
+        clear_checkpoints(FETCH_CHECKPOINT_DIR)
+        print(f"   - Appended {appended} air temperature readings.")
     else:
         print("   - Air temperature data is up to date. No fetch required.")
     return None
 
 
+def latest_air_temperature_time():
+    """Return the newest stored temperature reading time, or None if nothing is stored."""
+    snapshot = load_snapshot(TEMPERATURE_STORE)
+    if snapshot['metadata'].get('last_time'):
+        return pd.Timestamp(snapshot['metadata']['last_time'])
+    # Stores committed before the last time was recorded: only the newest month is opened
+    keys = list_partitions(TEMPERATURE_STORE, snapshot)
+    if not keys:
+        return None
+    return read_partitions(TEMPERATURE_STORE, keys[-1:], columns=['Time'], snapshot=snapshot)['Time'].max()
+
+
+def append_air_temperature(df_new):
+    """
+    Append fetched readings to the temperature store.
+
+    The store stays time-sorted and append-only: rows after the newest stored reading are
+    added as they are, and only rows inside the overlap window (at or before it, since each
+    fetch starts at the newest stored time) are checked against the stored months they fall
+    in. Only the months receiving rows are rewritten.
+
+    Returns:
+        int: Number of readings added.
+    """
+    df_new = df_new.dropna(subset=['Time'])
+    df_new = df_new.assign(Time=pd.to_datetime(df_new['Time']).astype('datetime64[ns]'))
+    df_new = df_new.drop_duplicates(subset=TEMPERATURE_KEY)
+    with writer_lock(TEMPERATURE_STORE):
+        latest_time = latest_air_temperature_time()
+        stored = read_partitions(TEMPERATURE_STORE, partition_keys(df_new['Time']).unique())
+        if latest_time is not None and not stored.empty:
+            # Only fetched rows up to the newest stored reading can be known already, and only
+            # stored rows from the start of the fetch can match them
+            overlap = (df_new['Time'] <= latest_time).to_numpy()
+            window = stored[stored['Time'] >= df_new['Time'].min()]
+            known = np.zeros(len(df_new), dtype=bool)
+            known[overlap] = pd.MultiIndex.from_frame(df_new.loc[overlap, TEMPERATURE_KEY]).isin(
+                pd.MultiIndex.from_frame(window[TEMPERATURE_KEY]))
+            df_new = df_new[~known]
+        if df_new.empty:
+            return 0
+
+        keys = partition_keys(df_new['Time']).unique()
+        if not stored.empty:
+            stored = stored[partition_keys(stored['Time']).isin(keys)]
+        df = pd.concat([stored, df_new], ignore_index=True) if not stored.empty else df_new
+        last_time = df_new['Time'].max() if latest_time is None else max(latest_time, df_new['Time'].max())
+        generation = write_partitions(df, TEMPERATURE_STORE, keys, time_col='Time',
+                                      metadata={'last_time': last_time.strftime("%Y-%m-%dT%H:%M:%S")})
+        # df holds every reading of the rewritten months, so their rollups can be recomputed exactly
+        update_temperature_rollups(df, keys, generation)
+    return len(df_new)
+
+
+def rollup_air_temperature(df, freq):
+    """Return the mean, min, max and count of the readings per site, measurement and period start."""
+    periods = df['Time'].dt.floor(freq).rename('Time')
+    rollup = df.groupby(['SiteName', 'MeasurementName', periods])['Value'].agg(['mean', 'min', 'max', 'count'])
+    rollup = rollup.reset_index()
+    rollup['count'] = rollup['count'].astype('int32')
+    return rollup
+
+
+def update_temperature_rollups(df, keys, source_generation):
+    """
+    Rewrite the rollup months in keys from df, which must hold every raw reading of those
+    months. Hours and days never span two months, so the result is exact.
+    """
+    for store, freq in TEMPERATURE_ROLLUPS.values():
+        write_partitions(rollup_air_temperature(df, freq), store, keys, time_col='Time',
+                         metadata={'source_generation': source_generation})
+
+
+def refresh_temperature_rollups():
+    """
+    Rebuild the rollups if they weren't built from the current temperature generation, e.g.
+    on the first run or after a refresh interrupted between the two commits. Months are read
+    one at a time.
+    """
+    with writer_lock(TEMPERATURE_STORE):
+        snapshot = load_snapshot(TEMPERATURE_STORE)
+        generation = snapshot['generation']
+        stale = [name for name, (store, _) in TEMPERATURE_ROLLUPS.items()
+                 if load_snapshot(store)['metadata'].get('source_generation') != generation]
+        keys = list_partitions(TEMPERATURE_STORE, snapshot)
+        if not stale or not keys:
+            return
+        print(f"   - Rebuilding {' and '.join(stale)} temperature rollups.")
+        rollups = {name: [] for name in stale}
+        for key in keys:
+            month = read_partitions(TEMPERATURE_STORE, [key], snapshot=snapshot)
+            for name in stale:
+                rollups[name].append(rollup_air_temperature(month, TEMPERATURE_ROLLUPS[name][1]))
+        for name in stale:
+            store = TEMPERATURE_ROLLUPS[name][0]
+            write_partitions(pd.concat(rollups[name], ignore_index=True), store,
+                             set(keys) | set(list_partitions(store)), time_col='Time',
+                             metadata={'source_generation': generation})
+
+
+def read_air_temperature(start=None, end=None, columns=None):
+    """
+    Read temperature readings between start and end (inclusive), opening only the months
+    that overlap the range.
+
+    Raises:
+        FileNotFoundError: If no temperature data has been stored.
+    """
+    return read_store(TEMPERATURE_STORE, start=start, end=end, columns=columns, time_col='Time',
+                      legacy_path=PARQUET_FILE)
+
+
+def read_temperature_rollup(name, start=None, end=None):
+    """
+    Read the 'hourly' or 'daily' temperature rollup (Time, mean, min, max, count) between
+    start and end. Until the first refresh has built it, the rollup is computed from the raw
+    readings instead.
+    """
+    store, freq = TEMPERATURE_ROLLUPS[name]
+    try:
+        return read_store(store, start=start, end=end, time_col='Time')
+    except FileNotFoundError:
+        return rollup_air_temperature(read_air_temperature(start, end), freq)
+
+
 def remove_day_suffix(text):
     return re.sub(r"(?<=\d)(st|nd|rd|th)", "", text)
 
 
-def load_metadata():
-    if os.path.exists(METADATA_PATH):
+# Parsed Genesis date prefixes, e.g. "1st September 2025" -> ("1 September 2025", Timestamp)
+_GENESIS_DATE_CACHE = {}
+
+
+def _parse_genesis_day(day_text):
+    parsed = _GENESIS_DATE_CACHE.get(day_text)
+    if parsed is None:
+        stripped = remove_day_suffix(day_text)
+        parsed = (stripped, pd.to_datetime(stripped, format='%d %B %Y', errors='coerce'))
+        _GENESIS_DATE_CACHE[day_text] = parsed
+    return parsed
+
+
+def parse_genesis_dates(dates):
+    """
+    Parse Genesis timestamps such as "01:00AM 1st September 2025" for a whole column.
+
+    Every row in a daily file shares the same date prefix and there are only 24 distinct
+    times, so both parts are factorised and only the unique values are parsed. Parsed
+    date prefixes are cached across calls.
+
+    Args:
+        dates (pd.Series): Raw Genesis 'date' column.
+
+    Returns:
+        tuple: (date1, datetime) Series aligned with `dates`. date1 is the text with the
+        ordinal suffix removed; datetime is NaT where the text could not be parsed.
+    """
+    parts = dates.str.split(' ', n=1, expand=True).reindex(columns=[0, 1]).astype(object)
+    time_codes, time_uniques = pd.factorize(parts[0])
+    day_codes, day_uniques = pd.factorize(parts[1])
+
+    parsed_days = [_parse_genesis_day(day) for day in day_uniques]
+    day_text = np.array([stripped for stripped, _ in parsed_days] + [np.nan], dtype=object)
+    day_values = pd.DatetimeIndex([value for _, value in parsed_days], dtype='datetime64[ns]')
+    time_values = pd.to_datetime(pd.Index(time_uniques, dtype=object), format='%I:%M%p', errors='coerce') - pd.Timestamp(1900, 1, 1)
+
+    # Code -1 (missing) picks the trailing NaN / fills NaT
+    date1 = parts[0].str.cat(pd.Series(day_text[day_codes], index=dates.index), sep=' ')
+    datetime_values = day_values.array.take(day_codes, allow_fill=True) + time_values.array.take(time_codes, allow_fill=True)
+    return date1, pd.Series(datetime_values, index=dates.index)
+
+
+def load_metadata(source):
+    """
+    Return the ingest metadata of a usage source (processed-file manifest, last datetime,
+    billing hash) as committed with the current generation of its store.
+    """
+    metadata = load_snapshot(USAGE_SOURCES[source]['store'])['metadata']
+    if not metadata and os.path.exists(METADATA_PATH):
+        # Stores committed before the metadata moved into the snapshots
         with open(METADATA_PATH, 'r') as f:
-            return json.load(f)
-    return {"processed_files_electricty": [], "last_datetime_electricity": None}
+            metadata = {k: v for k, v in json.load(f).items() if k.endswith(f"_{source}")}
+    # Older metadata.json files hold a list of absolute paths per source
+    migrate_processed_list(metadata, source, search_dirs=[DOWNLOADS_FOLDER])
+    metadata.setdefault(f"last_datetime_{source}", None)
+    return metadata
 
 
-def save_metadata(metadata):
-    with open(METADATA_PATH, 'w') as f:
-        json.dump(metadata, f, indent=4)
+def discover_new_files(metadata, source):
+    """
+    Return ([(path, manifest entry)] of files matching the source pattern that haven't been
+    processed, [(path, manifest entry)] of processed files whose entry needs updating).
+    """
+    all_files = glob.glob(USAGE_SOURCES[source]['pattern'])
+    return find_new_files(metadata[manifest_key(source)], all_files)
 
 
 def discover_new_electricity_files(metadata):
-    all_files = glob.glob(FILE_PATTERN_ELECTRICITY)
-    return [f for f in all_files if f not in metadata.get("processed_files_electricity", [])]
+    return [path for path, _ in discover_new_files(metadata, 'electricity')[0]]
 
 def discover_new_gas_files(metadata):
-    all_files = glob.glob(FILE_PATTERN_GAS)
-    return [f for f in all_files if f not in metadata.get("processed_files_gas", [])]
-
-
-def read_and_filter(files, last_date=None):
-    dataframes = []
-    for file in files:
-        df = pd.read_csv(file)
-        df['date1'] = df['date'].apply(remove_day_suffix)
-        df['datetime'] = pd.to_datetime(df['date1'], format='%I:%M%p %d %B %Y', errors='coerce')
-        df = df.dropna(subset=['datetime'])
-        if last_date:
-            cutoff = pd.to_datetime(last_date)
-            df = df[df['datetime'] > cutoff]
-        dataframes.append(df)
+    return [path for path, _ in discover_new_files(metadata, 'gas')[0]]
+
+
+def read_genesis_file(file, last_date=None):
+    df = pd.read_csv(file)
+    df['date1'], df['datetime'] = parse_genesis_dates(df['date'])
+    df = df.dropna(subset=['datetime'])
+    if last_date:
+        cutoff = pd.to_datetime(last_date)
+        df = df[df['datetime'] > cutoff]
+    return df
+
+
+def read_and_filter(files, last_date=None, workers=None, executor=None):
+    """
+    Read Genesis CSV files and return their rows merged in timestamp order.
+
+    Args:
+        files (list): CSV file paths.
+        last_date (str, optional): Only keep rows after this datetime.
+        workers (int, optional): Number of processes used to parse the files. Defaults to
+            INGEST_WORKERS; 1 reads the files serially in this process.
+        executor (ProcessPoolExecutor, optional): Existing pool to parse the files in;
+            takes precedence over workers.
+
+    Returns:
+        pd.DataFrame: The same frame whichever number of workers is used.
+    """
+    workers = INGEST_WORKERS if workers is None else workers
+    if executor is not None:
+        dataframes = list(executor.map(read_genesis_file, files, [last_date] * len(files),
+                                       chunksize=max(1, len(files) // (workers * 4))))
+    elif workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            dataframes = list(executor.map(read_genesis_file, files, [last_date] * len(files),
+                                           chunksize=max(1, len(files) // (workers * 4))))
+    else:
+        dataframes = [read_genesis_file(file, last_date) for file in files]
+
+    # Order by each file's first reading (then name) so the result doesn't depend on glob order
+    order = sorted(range(len(files)),
+                   key=lambda i: (dataframes[i]['datetime'].min() if not dataframes[i].empty else pd.Timestamp.max,
+                                  os.path.basename(files[i])))
+    dataframes = [dataframes[i] for i in order]
     return pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame()
 
 
@@ -285,79 +524,199 @@ def enrich_datetime_info(df):
     return df
 
 
+# Hour -> daypart lookup per output column: column -> (24 category codes, category labels)
+DAYPART_SCHEMES = {}
+
+
+def register_daypart_scheme(column, hour_ranges):
+    """
+    Register a daypart classification written to `column` by assign_dayparts and
+    derived on read by read_usage.
+
+    Args:
+        column (str): Output column name.
+        hour_ranges (list): (label, first_hour, last_hour) tuples covering hours 0-23.
+            Labels may repeat; category order follows first appearance.
+    """
+    labels = [None] * 24
+    for label, first_hour, last_hour in hour_ranges:
+        for hour in range(first_hour, last_hour + 1):
+            labels[hour] = label
+    if None in labels:
+        raise ValueError(f"Daypart scheme '{column}' does not cover every hour of the day.")
+    categories = list(dict.fromkeys(label for label, _, _ in hour_ranges))
+    codes = np.array([categories.index(label) for label in labels], dtype=np.int8)
+    DAYPART_SCHEMES[column] = (codes, categories)
+
+
+register_daypart_scheme('d_time', [('Atapo', 0, 5), ('Ata', 6, 11), ('Ahiahi', 12, 17), ('Po', 18, 23)])
+register_daypart_scheme('d_time1', [('Atapo', 0, 3), ('Breakfast', 4, 7), ('Ata', 8, 11),
+                                    ('Ahiahi', 12, 15), ('Dinner', 16, 19), ('Po', 20, 23)])
+
+
+def apply_daypart_schemes(df, time_col='index'):
+    """(Re)compute every registered daypart column from one hour-of-day array."""
+    hours = df[time_col].dt.hour.to_numpy()
+    for column, (codes, categories) in DAYPART_SCHEMES.items():
+        df[column] = pd.Categorical.from_codes(codes[hours], categories=categories, ordered=True)
+    return df
+
+
 def assign_dayparts(df):
     if 'datetime' not in df.columns:
         raise KeyError("'datetime' column is required in the DataFrame.")
 
-    df = df.copy()
-    df = df.set_index('datetime')
-    df.index.name = None  # Remove name to prevent KeyError
-    df['d_time'] = None
-    df['d_time1'] = None
-
-    df.loc[df.between_time('18:00', '23:59').index, 'd_time'] = 'Po'
-    df.loc[df.between_time('00:00', '05:59').index, 'd_time'] = 'Atapo'
-    df.loc[df.between_time('06:00', '11:59').index, 'd_time'] = 'Ata'
-    df.loc[df.between_time('12:00', '17:59').index, 'd_time'] = 'Ahiahi'
-
-    df.loc[df.between_time('00:00', '03:59').index, 'd_time1'] = 'Atapo'
-    df.loc[df.between_time('04:00', '07:59').index, 'd_time1'] = 'Breakfast'
-    df.loc[df.between_time('08:00', '11:59').index, 'd_time1'] = 'Ata'
-    df.loc[df.between_time('12:00', '15:59').index, 'd_time1'] = 'Ahiahi'
-    df.loc[df.between_time('16:00', '19:59').index, 'd_time1'] = 'Dinner'
-    df.loc[df.between_time('20:00', '23:59').index, 'd_time1'] = 'Po'
-
-    return df.reset_index()
-
-def assign_billMonths(df):
-    if 'index' not in df.columns:
-        raise KeyError("'index' column is required in the DataFrame.")
-    
-    df = df.copy()
-    # df = df.set_index('datetime')
-    # df.index.name = None  # Remove name to prevent KeyError
-    df['billMonth'] = None
-    
-    file_path = DOWNLOADS_FOLDER + "/" + STORE_BILLING
+    # The datetime column is stored as the leading 'index' column
+    df = df.rename(columns={'datetime': 'index'})
+    df = df[['index'] + [c for c in df.columns if c != 'index']].reset_index(drop=True)
+    return apply_daypart_schemes(df)
+
+# Billing periods keyed by file path -> (mtime, DataFrame), so each ingest reads the CSV once
+_BILLING_CACHE = {}
+
+
+def billing_periods_path():
+    return DOWNLOADS_FOLDER + "/" + STORE_BILLING
+
+
+def load_billing_periods():
+    file_path = billing_periods_path()
 
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Billing periods file not found: {file_path}")
-    else:
+
+    mtime = os.path.getmtime(file_path)
+    cached = _BILLING_CACHE.get(file_path)
+    if cached is None or cached[0] != mtime:
         df_bill = pd.read_csv(file_path)
+        df_bill['start_date'] = pd.to_datetime(df_bill['bill_period_start'])
+        df_bill['end_date'] = pd.to_datetime(df_bill['bill_period_end']).dt.normalize()
+        df_bill['duration'] = (df_bill['end_date'] - df_bill['start_date']).dt.days+1
+        df_bill = df_bill.sort_values('start_date', kind='stable').reset_index(drop=True)
+        cached = (mtime, df_bill)
+        _BILLING_CACHE[file_path] = cached
+    return cached[1]
 
-    df_bill['start_date'] = pd.to_datetime(df_bill['bill_period_start'])
-    df_bill['end_date'] = pd.to_datetime(df_bill['bill_period_end']).dt.normalize()
-    df_bill['duration'] = (df_bill['end_date'] - df_bill['start_date']).dt.days+1
-    
-    max_day = df['index'].max()
+
+def bill_month_windows(max_day, df_bill=None):
+    """
+    Return each billing period's window [start_date, window_end) relative to max_day.
+
+    Every period covers the same number of days as the current (latest) period has data
+    for, so months are compared like for like.
+    """
+    df_bill = load_billing_periods() if df_bill is None else df_bill
     current_bill_start_date = df_bill['start_date'].max()
-    var=max_day-current_bill_start_date+ timedelta(days=1)
-    df_bill['days'] = var.days
-    df_bill['relative_current_dates'] = df_bill["start_date"]+ timedelta(days=var.days-1)
- 
-    for i in range(len(df_bill)):
-        start_date = df_bill['start_date'].iloc[i]
-        end_date = df_bill['relative_current_dates'].iloc[i] + timedelta(days=1)  # Include the end date in the range
-        
-        # Filter data for the current billing period
-        df.loc[(df['index'] >= start_date) & (df['index'] < end_date), 'billMonth'] = df_bill['month'].iloc[i]
-        recs = len(df.loc[(df['index'] >= start_date) & (df['index'] < end_date), 'billMonth'])
-        if recs > 0:
-            print(f"   - Assigning bill month {df_bill['month'].iloc[i]} to {recs} rows")
-        
+    var = pd.Timestamp(max_day) - current_bill_start_date + timedelta(days=1)
+    windows = df_bill[['month', 'start_date']].copy()
+    windows['window_end'] = windows['start_date'] + timedelta(days=var.days)
+    return windows
+
+
+def changed_bill_windows(old_max_day, new_max_day, df_bill=None):
+    """Return the [start, end) ranges whose bill month can differ between the two max days."""
+    old = bill_month_windows(old_max_day, df_bill)
+    new = bill_month_windows(new_max_day, df_bill)
+    lo = np.maximum(old['start_date'], np.minimum(old['window_end'], new['window_end']))
+    hi = np.maximum(old['window_end'], new['window_end'])
+    return [(l, h) for l, h in zip(lo, hi) if l < h]
+
+
+def assign_billMonths(df, max_day=None, df_bill=None):
+    """
+    Label each row with the billing period whose window contains it.
+
+    A single searchsorted over the sorted period starts finds the latest period starting
+    at or before each row, so the cost is O(n log p) for n rows and p periods.
+
+    Args:
+        df (pd.DataFrame): Frame with an 'index' datetime column.
+        max_day (Timestamp, optional): Latest reading in the store; defaults to the
+            frame's own maximum. Pass it when df only holds part of the history.
+        df_bill (pd.DataFrame, optional): Billing periods; defaults to billing_periods.csv.
+    """
+    if 'index' not in df.columns:
+        raise KeyError("'index' column is required in the DataFrame.")
+
+    df = df.copy()
+    df['billMonth'] = None
+    max_day = df['index'].max() if max_day is None else max_day
+    if df.empty or pd.isna(max_day):
+        return df
+
+    windows = bill_month_windows(max_day, df_bill)
+    times = df['index'].to_numpy(dtype='datetime64[ns]')
+    pos = np.searchsorted(windows['start_date'].to_numpy(dtype='datetime64[ns]'), times, side='right') - 1
+    period = np.clip(pos, 0, None)
+    inside = (pos >= 0) & (times < windows['window_end'].to_numpy(dtype='datetime64[ns]')[period])
+    df['billMonth'] = np.where(inside, windows['month'].to_numpy(dtype=object)[period], None)
+
+    counts = pd.Series(period[inside]).value_counts().sort_index()
+    for i, recs in counts.items():
+        print(f"   - Assigning bill month {windows['month'].iloc[i]} to {recs} rows")
+
     return df
 
 def get_bill_period_start_date():
-    file_path = DOWNLOADS_FOLDER + "/" + STORE_BILLING
+    df_bill = load_billing_periods()
+    return df_bill['start_date'].max()
 
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Billing periods file not found: {file_path}")
-    else:
-        df_bill = pd.read_csv(file_path)
+def _latest_per_hour(df):
+    # Later rows win, except that an estimate never replaces another type of reading
+    firm = (df['type'] != 'estimated').to_numpy()
+    ranked = df.assign(_firm=firm).sort_values(['index', '_firm'], kind='stable')
+    return ranked.drop_duplicates(subset='index', keep='last').drop(columns='_firm')
+
+
+def upsert_readings(stored, incoming):
+    """
+    Merge incoming readings into the stored ones by timestamp.
+
+    An incoming reading replaces the stored reading for the same hour unless it is an
+    estimate and the stored one is not, so re-issued files correct earlier estimates but
+    a late estimate can't overwrite an actual reading. Among incoming rows for the same
+    hour the last one wins on the same rule.
+
+    Args:
+        stored (pd.DataFrame): Compact usage rows sorted by 'index'.
+        incoming (pd.DataFrame): Compact usage rows in arrival order.
+
+    Returns:
+        tuple: (merged frame sorted by 'index' with one row per hour,
+        timestamps of the rows that were added or whose values changed)
+    """
+    # Stores written before the upsert can hold an hour twice
+    stored = stored.drop_duplicates(subset='index', keep='last')
+    incoming = _latest_per_hour(incoming)
+
+    old_times = stored['index'].to_numpy()
+    new_times = incoming['index'].to_numpy()
+    pos = np.searchsorted(old_times, new_times)
+    matched = np.zeros(len(new_times), dtype=bool)
+    in_range = pos < len(old_times)
+    matched[in_range] = old_times[pos[in_range]] == new_times[in_range]
+
+    blocked = np.zeros(len(new_times), dtype=bool)
+    blocked[matched] = ((stored['type'].to_numpy()[pos[matched]] != 'estimated')
+                        & (incoming['type'].to_numpy()[matched] == 'estimated'))
+    replace = matched & ~blocked
+
+    # Replacements that leave the values as they were don't count as changes
+    value_cols = ['usage', 'cents', 'type']
+    old_rows = stored.iloc[pos[replace]][value_cols].reset_index(drop=True)
+    new_rows = incoming[replace][value_cols].reset_index(drop=True)
+    same = (old_rows.astype(object).eq(new_rows.astype(object))
+            | (old_rows.isna() & new_rows.isna())).all(axis=1).to_numpy()
+    revised = np.flatnonzero(replace)[~same]
+    changed = np.sort(np.concatenate([new_times[~matched], new_times[revised]]))
+
+    keep_stored = np.ones(len(old_times), dtype=bool)
+    keep_stored[pos[replace]] = False
+    merged = pd.concat([stored[keep_stored], incoming[~matched | replace]], ignore_index=True)
+    # Both parts are already sorted, so the stable sort is a linear merge of two runs
+    merged = merged.sort_values('index', kind='stable', ignore_index=True)
+    return merged, pd.DatetimeIndex(changed)
 
-    df_bill['start_date'] = pd.to_datetime(df_bill['bill_period_start'])
-    
-    return df_bill['start_date'].max()
 
 def clean_usage_data(df):
     df[['usage', 'units']] = df['usage'].str.split(' ', expand=True)
@@ -367,7 +726,14 @@ def clean_usage_data(df):
     return df
 
 
+def violin_points(df):
+    # Every reading as a point is only readable (and cheap to draw) for small frames
+    return 'all' if len(df) <= MAX_POINTS else 'outliers'
+
+
 def plot_summary(df, plot_type="bar"):
+    # plotly.express is slow to import and the web app doesn't need it
+    import plotly.express as px
     
     year = datetime.now().year
     first_day = datetime(year, 1, 1)
@@ -434,7 +800,7 @@ def plot_summary(df, plot_type="bar"):
             color='Category',
             category_orders={'Month': ordered_months, 'Category': ordered_dayparts},
             box=True,
-            points='all',
+            points=violin_points(df),
             title='Usage Distribution by Daypart and Month (Violin Plot)'
         )
         fig.update_layout(
@@ -449,6 +815,8 @@ def plot_summary(df, plot_type="bar"):
 
 
 def create_usage_plot(df, plot_type="bar"):
+    # plotly.express is slow to import and the web app doesn't need it
+    import plotly.express as px
     ordered_months = ["January", "February", "March", "April", "May", "June",
                       "July", "August", "September", "October", "November", "December"]
     ordered_dayparts = ["Atapo", "Breakfast", "Ata", "Ahiahi", "Dinner", "Po"]
@@ -477,7 +845,7 @@ def create_usage_plot(df, plot_type="bar"):
     elif plot_type == "violin":
         fig = px.violin(df, x='Month', y='usage', color='Category',
                         category_orders={'Month': ordered_months, 'Category': ordered_dayparts},
-                        box=True, points='all',
+                        box=True, points=violin_points(df),
                         title='Usage Distribution by Daypart and Month (Violin Plot)')
         fig.update_layout(xaxis_title='Month', yaxis_title='Usage (kWh)')
     else:
@@ -485,10 +853,7 @@ def create_usage_plot(df, plot_type="bar"):
     return fig
 
 
-def check_data():
-    print("Checking all data...")
-    df_electric = check_electricity_data()
-    df_gas = check_gas_data()
-    check_air_temperature_data()
-    print("Data checks complete.")
-    return df_electric
+def check_data(workers=None):
+    # The sources are refreshed concurrently; see refresh.py
+    from refresh import refresh_all
+    return refresh_all(workers=workers)['electricity']
@@ -0,0 +1,55 @@
+# --- file: downsample.py ---
+# Point budgets for the dashboard's dense line charts.
+# A line chart can't show more than about two points per horizontal pixel, so series are
+# reduced with largest-triangle-three-buckets (LTTB) to MAX_POINTS before they are sent, which
+# keeps peaks and troughs that plain decimation would drop. Traces still above WEBGL_POINTS
+# are drawn with WebGL (scattergl) rather than SVG.
+#
+#   keep = lttb(df['Time'], df['Value'], MAX_POINTS)
+#   x, y = df['Time'].iloc[keep], df['Value'].iloc[keep]
+import os
+import numpy as np
+
+PLOT_WIDTH_PX = int(os.environ.get('PLOT_WIDTH_PX', 800))
+MAX_POINTS = 2 * PLOT_WIDTH_PX
+WEBGL_POINTS = int(os.environ.get('WEBGL_POINTS', 1000))
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ns]').astype('int64')
+    return values.astype('float64')
+
+
+def lttb(x, y, threshold):
+    """
+    Positions of at most threshold points of (x, y) that keep its visual shape.
+
+    x must be sorted; the first and last points are always kept. Returns every position
+    when the series is already within threshold.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x, y = _as_float(x), _as_float(y)
+    # threshold - 2 buckets between the fixed first and last points
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(int) + 1
+    edges[-1] = n - 1
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # The next bucket is represented by its average; the last one by the final point
+        following = slice(end, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def line_type(points):
+    """Plotly trace type for a line of this many points."""
+    return 'scattergl' if points > WEBGL_POINTS else 'scatter'
@@ -3,9 +3,16 @@
 import dash
 from dash import Dash, html, dcc
 import dash_bootstrap_components as dbc
+import plotly.io as pio
+import response_cache
+
+# Dark theme for every page, set once: each assignment validates and copies the template
+pio.templates.default = "plotly_dark"
 
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.DARKLY])
 server = app.server  # Flask app for WSGI
+# Repeat callback requests are answered from stored, pre-compressed responses
+response_cache.install(app)
 
 # Define the navigation bar
 navbar = dbc.NavbarSimple(
@@ -0,0 +1,96 @@
+# --- file: hilltop_fetch.py ---
+# Chunked, concurrent and resumable Hilltop fetch.
+# The requested range is split into windows on a fixed grid anchored at midnight of its start,
+# the windows are fetched by a bounded thread pool, and each completed window is checkpointed
+# as <checkpoint_dir>/<start>_<end>.parquet. A rerun after a failure only fetches windows that
+# have no checkpoint yet; clear_checkpoints removes them once the data has been stored.
+import os
+import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLUMNS = ['SiteName', 'MeasurementName', 'Time', 'Value']
+
+
+def fetch_windows(from_date, to_date, window):
+    """Split [from_date, to_date] into consecutive (start, end) windows of at most window."""
+    start, end = pd.Timestamp(from_date), pd.Timestamp(to_date)
+    if end <= start:
+        return []
+    grid = pd.date_range(start.normalize(), end, freq=pd.Timedelta(window))
+    edges = [start] + [t for t in grid if start < t < end] + [end]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _checkpoint_path(checkpoint_dir, start, end):
+    return os.path.join(checkpoint_dir, f"{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.parquet")
+
+
+def _fetch_window(ht, site, measurement, start, end, checkpoint_dir):
+    df = ht.get_data(site, measurement, from_date=start.strftime(DATE_FORMAT), to_date=end.strftime(DATE_FORMAT))
+    # Empty windows are checkpointed too, so they aren't requested again
+    df = df.reindex(columns=COLUMNS)
+    df['Time'] = pd.to_datetime(df['Time'])
+    df['Value'] = pd.to_numeric(df['Value'])
+    path = _checkpoint_path(checkpoint_dir, start, end)
+    df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return len(df)
+
+
+def fetch_range(base_url, hts, site, measurement, from_date, to_date, window=pd.Timedelta(days=7),
+                workers=4, checkpoint_dir="hilltop_checkpoints"):
+    """
+    Fetch one site and measurement between from_date and to_date in windows.
+
+    Args:
+        window (pd.Timedelta): Length of each request.
+        workers (int): Maximum number of requests in flight.
+        checkpoint_dir (str): Folder holding completed windows between runs.
+
+    Returns:
+        pd.DataFrame: SiteName, MeasurementName, Time, Value sorted by Time.
+
+    Raises:
+        RuntimeError: If any window failed. Completed windows stay checkpointed, so calling
+        again with the same range only requests the failed ones.
+    """
+    windows = fetch_windows(from_date, to_date, window)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    pending = [(s, e) for s, e in windows if not os.path.exists(_checkpoint_path(checkpoint_dir, s, e))]
+    print(f"   - {len(windows)} windows of {pd.Timedelta(window)}, {len(windows) - len(pending)} already fetched.")
+
+    if pending:
+        # Imported here: the web app reads the stores but never fetches
+        from hilltoppy import Hilltop
+        ht = Hilltop(base_url, hts)
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+            futures = {executor.submit(_fetch_window, ht, site, measurement, s, e, checkpoint_dir): (s, e)
+                       for s, e in pending}
+            for future in as_completed(futures):
+                start, end = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as err:
+                    failed.append(start)
+                    print(f"   - Window {start} to {end} failed: {err}")
+                    continue
+                print(f"   - Fetched {rows} readings from {start} to {end}.")
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(windows)} Hilltop windows failed; "
+                               f"rerun to resume from {min(failed)}.")
+
+    frames = [pd.read_parquet(_checkpoint_path(checkpoint_dir, s, e)) for s, e in windows]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.concat(frames, ignore_index=True).dropna(subset=['Time'])
+    # Neighbouring windows share their boundary reading
+    df = df.drop_duplicates(subset=['SiteName', 'MeasurementName', 'Time'])
+    return df.sort_values('Time', ignore_index=True)
+
+
+def clear_checkpoints(checkpoint_dir="hilltop_checkpoints"):
+    for path in glob.glob(os.path.join(checkpoint_dir, "*.parquet")):
+        os.remove(path)
@@ -0,0 +1,114 @@
+# --- file: hilltop_stub.py ---
+# Local stand-in for a Hilltop web service, for running the air temperature fetch offline.
+# Answers the SiteList, MeasurementList and GetData requests hilltoppy makes, serving the
+# readings of a Parquet file (default: air_temperature.parquet) for a single site.
+#
+#   python hilltop_stub.py --port 8765
+#   HILLTOP_URL=http://127.0.0.1:8765/ python main.py
+#
+# --fail-rate makes a share of GetData requests fail, to exercise retries and resuming.
+import argparse
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape, quoteattr
+import pandas as pd
+
+
+def _site_list(df):
+    sites = "".join(f"<Site Name={quoteattr(s)}/>" for s in df["SiteName"].unique())
+    return f"<HilltopServer><Agency>Stub</Agency>{sites}</HilltopServer>"
+
+
+def _measurement_list(df, site):
+    rows = df[df["SiteName"] == site]
+    sources = []
+    for measurement, readings in rows.groupby("MeasurementName"):
+        sources.append(
+            f"<DataSource Name={quoteattr(measurement)} NumItems=\"1\">"
+            "<TSType>StdSeries</TSType><DataType>SimpleTimeSeries</DataType><Interpolation>Instant</Interpolation>"
+            f"<From>{readings['Time'].min():%Y-%m-%dT%H:%M:%S}</From><To>{readings['Time'].max():%Y-%m-%dT%H:%M:%S}</To>"
+            f"<Measurement Name={quoteattr(measurement)}><RequestAs>{escape(measurement)}</RequestAs>"
+            "<Item>1</Item><Units>degC</Units><Format>#.##</Format></Measurement></DataSource>")
+    return f"<HilltopServer><Agency>Stub</Agency>{''.join(sources)}</HilltopServer>"
+
+
+def _time_bound(text, default):
+    return default if text in ("", "now") else pd.Timestamp(text)
+
+
+def _get_data(df, site, measurement, interval):
+    start_text, _, end_text = interval.partition("/")
+    start = _time_bound(start_text, pd.Timestamp.min)
+    end = _time_bound(end_text, pd.Timestamp.now())
+    rows = df[(df["SiteName"] == site) & (df["MeasurementName"] == measurement)
+              & (df["Time"] >= start) & (df["Time"] <= end)]
+    if rows.empty:
+        return "<Hilltop><Error>No data</Error></Hilltop>"
+    values = "".join(f"<E><T>{t:%Y-%m-%dT%H:%M:%S}</T><I1>{v}</I1></E>"
+                     for t, v in zip(rows["Time"], rows["Value"]))
+    return (f"<Hilltop><Agency>Stub</Agency><Measurement SiteName={quoteattr(site)}>"
+            f"<DataSource Name={quoteattr(measurement)} NumItems=\"1\"><TSType>StdSeries</TSType>"
+            "<DataType>SimpleTimeSeries</DataType><Interpolation>Instant</Interpolation></DataSource>"
+            f"<Data DateFormat=\"Calendar\" NumItems=\"1\">{values}</Data></Measurement></Hilltop>")
+
+
+def make_handler(df, fail_rate=0.0):
+    class HilltopHandler(BaseHTTPRequestHandler):
+        requests_served = 0
+
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            request = query.get("Request")
+            if request == "GetData" and random.random() < fail_rate:
+                self.send_error(503, "Injected failure")
+                return
+            if request == "SiteList":
+                body = _site_list(df)
+            elif request == "MeasurementList":
+                body = _measurement_list(df, query.get("Site"))
+            elif request == "GetData":
+                body = _get_data(df, query.get("Site"), query.get("Measurement"), query.get("TimeInterval", ""))
+            else:
+                body = f"<Hilltop><Error>Unsupported request {escape(str(request))}</Error></Hilltop>"
+            HilltopHandler.requests_served += 1
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HilltopHandler
+
+
+def start_stub_server(df, port=0, fail_rate=0.0):
+    """
+    Serve df (SiteName, MeasurementName, Time, Value) on a background thread.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() to stop it.
+    """
+    df = df.assign(Time=pd.to_datetime(df["Time"])).sort_values("Time")
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(df, fail_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a Parquet file through a stand-in Hilltop web service.")
+    parser.add_argument("--parquet", default="air_temperature.parquet")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of GetData requests answered with 503")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(pd.read_parquet(args.parquet), args.port, args.fail_rate)
+    print(f" + Hilltop stub serving {args.parquet} at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -3,11 +3,8 @@ import glob
 import os
 
 import datetime
-import re
 
-def remove_day_suffix(text):
-  """Removes ordinal suffixes from a string."""
-  return re.sub(r"(?<=\d)(st|nd|rd|th)", "", text)
+from data_utils import parse_genesis_dates
 
 
 # Define the path to the Downloads folder
@@ -50,10 +47,8 @@ print(combined_df)
 #combined_df.to_csv(os.path.join(downloads_folder, "combined_data.csv"), index=False)
 
 
-# Apply the function to the column
-combined_df['date1'] = combined_df['date'].apply(remove_day_suffix)
-
-combined_df['datetime'] = pd.to_datetime(combined_df['date1'], format='%I:%M%p %d %B %Y')
+# Strip the ordinal suffixes and parse the timestamps for the whole column
+combined_df['date1'], combined_df['datetime'] = parse_genesis_dates(combined_df['date'])
 combined_df = combined_df.sort_values(by='datetime')
 combined_df['YYYYMMDD'] = combined_df['datetime'].dt.strftime('%Y-%m-%d')
 combined_df['Weekday'] = pd.to_datetime(combined_df['datetime'], format='%a').dt.day_name()
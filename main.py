@@ -1,8 +1,18 @@
 # --- file: main.py ---
-from data_utils import check_data
+import argparse
+from data_utils import INGEST_WORKERS
+from refresh import refresh_all
 from data_utils import plot_summary
 import pandas as pd
 
-df = check_data()
+if __name__ == "__main__":
+    # The guard is needed so worker processes can import this module without re-running the checks
+    parser = argparse.ArgumentParser(description="Update the energy usage datastores.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="processes used to parse new Genesis CSV files (default: %(default)s)")
+    args = parser.parse_args()
 
-# plot_summary(df, plot_type="bar")     # classic bar chart
\ No newline at end of file
+    frames = refresh_all(workers=args.workers)
+    df = frames['electricity']
+
+    # plot_summary(df, plot_type="bar")     # classic bar chart
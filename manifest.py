@@ -0,0 +1,96 @@
+# --- file: manifest.py ---
+# Processed-file manifest. Each source maps a file's base name to a short content hash and the
+# size and modification time the file had when it was hashed, e.g.
+#   metadata["processed_electricity"] = {"Genesis Energy - ... .csv":
+#       {"hash": "3f2a9c1e0b7d4a65", "size": 2310, "mtime_ns": 1756771200000000000}}
+# so lookups are dict hits, a file re-downloaded into another folder still matches, and only
+# files that are unknown or whose size or modification time changed are read and hashed.
+import os
+import hashlib
+
+# Hash recorded for files migrated from the old path list whose content was no longer on disk.
+# The first time such a file turns up its hash is recorded without ingesting it again.
+UNKNOWN_HASH = ""
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+
+
+def manifest_key(source):
+    return f"processed_{source}"
+
+
+def file_entry(path):
+    """Manifest entry for the file at path."""
+    # Stat first: if the file changes while it is read, the next run sees a new stat
+    stat = os.stat(path)
+    return {"hash": file_digest(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _unchanged(recorded, path):
+    stat = os.stat(path)
+    return recorded.get("size") == stat.st_size and recorded.get("mtime_ns") == stat.st_mtime_ns
+
+
+def migrate_processed_list(metadata, source, search_dirs=()):
+    """
+    Convert the old metadata["processed_files_<source>"] list of absolute paths into the
+    manifest. Files are hashed from their recorded path or, failing that, from the first of
+    search_dirs that holds a file with the same name. Entries holding only a hash (as
+    written before sizes and times were recorded) become {"hash": ...}, so those files are
+    hashed once more.
+    """
+    legacy_key = f"processed_files_{source}"
+    manifest = metadata.setdefault(manifest_key(source), {})
+    for name, recorded in manifest.items():
+        if isinstance(recorded, str):
+            manifest[name] = {"hash": recorded}
+    if legacy_key not in metadata:
+        return manifest
+
+    for path in metadata.pop(legacy_key):
+        name = os.path.basename(path)
+        candidates = [path] + [os.path.join(d, name) for d in search_dirs]
+        existing = next((p for p in candidates if os.path.exists(p)), None)
+        manifest[name] = file_entry(existing) if existing else {"hash": UNKNOWN_HASH}
+    return manifest
+
+
+def find_new_files(manifest, paths):
+    """
+    Sort the files in paths the manifest doesn't describe as they are on disk.
+
+    A file is new when its name is unknown and its content hasn't been recorded under
+    another name, or when a known name now has different content (a re-issued file).
+    Files with an unchanged size and modification time are not read.
+
+    Returns:
+        tuple: ([(path, entry)] of new files to ingest, [(path, entry)] of files whose entry
+        only needs updating: a copy of recorded content, a touched but unchanged file, or the
+        first sighting of a file migrated with UNKNOWN_HASH).
+    """
+    known_digests = {recorded["hash"] for recorded in manifest.values()}
+    new_files, refreshed = [], []
+    for path in paths:
+        name = os.path.basename(path)
+        recorded = manifest.get(name)
+        if recorded is not None and _unchanged(recorded, path):
+            continue
+        entry = file_entry(path)
+        if recorded is None:
+            target = refreshed if entry["hash"] in known_digests else new_files
+        elif recorded["hash"] in (UNKNOWN_HASH, entry["hash"]):
+            if recorded["hash"] == UNKNOWN_HASH:
+                print(f"   - Recording the content of {name}, processed before hashes were kept.")
+            target = refreshed
+        else:
+            target = new_files
+        target.append((path, entry))
+    return new_files, refreshed
+
+
+def record_files(manifest, entries):
+    for path, entry in entries:
+        manifest[os.path.basename(path)] = entry
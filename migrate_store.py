@@ -0,0 +1,33 @@
+# --- file: migrate_store.py ---
+# Convert the usage stores to the current compact schema in place.
+# Legacy single-file stores are first split into monthly partitions; partitions already
+# at the current version are left untouched, so the command is safe to re-run.
+import os
+import pandas as pd
+from data_utils import USAGE_SOURCES
+from usage_schema import SCHEMA_VERSION, schema_version, to_compact
+from usage_store import (list_partitions, load_snapshot, migrate_legacy_file, partition_path,
+                         read_partitions, write_partitions, writer_lock)
+
+
+def store_size(root):
+    snapshot = load_snapshot(root)
+    return sum(os.path.getsize(partition_path(root, key, snapshot)) for key in list_partitions(root, snapshot))
+
+
+if __name__ == "__main__":
+    for source, config in USAGE_SOURCES.items():
+        print(f" + Migrating {source} store to schema version {SCHEMA_VERSION}...")
+        store = config['store']
+        with writer_lock(store):
+            migrate_legacy_file(config['legacy_path'], store)
+            before = store_size(store)
+            snapshot = load_snapshot(store)
+            stale = [key for key in list_partitions(store, snapshot)
+                     if schema_version(pd.read_parquet(partition_path(store, key, snapshot))) < SCHEMA_VERSION]
+            if stale:
+                # One generation for the whole conversion
+                df = read_partitions(store, stale, snapshot=snapshot)
+                write_partitions(to_compact(df), store, stale)
+                print(f"   - Converted {', '.join(stale)}")
+            print(f"   - {before / 1024:.0f} KB -> {store_size(store) / 1024:.0f} KB")
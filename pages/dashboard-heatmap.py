@@ -1,18 +1,19 @@
 import pandas as pd
 import numpy as np
 import dash
-from dash import dcc, html, callback
+from dash import Patch, dcc, html, callback
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import calendar
-from datetime import datetime, timedelta
-import plotly.io as pio
-from data_utils import (check_forecast_electricty_data,
-                        get_bill_period_start_date)
+from datetime import datetime
+from data_utils import (DOWNLOADS_FOLDER, check_forecast_electricty_data,
+                        get_bill_period_start_date, read_air_temperature)
+import data_registry
+from callback_cache import memoize
+from downsample import MAX_POINTS, line_type, lttb
 
-# Set dark theme
-pio.templates.default = "plotly_dark"
 # app = dash.Dash(__name__, external_stylesheets=[dbc.themes.DARKLY]) #COSMO, #CYBORG, #DARKLY
 # server = app.server
 # app.title = "Usage and heatmap dashboard"
@@ -23,30 +24,47 @@ dash.register_page(__name__)
 # Variables
 # -------------------------
 # bill_period_start = datetime.strptime("2025-07-13","%Y-%m-%d").date()  # Example bill period start date
-bill_period_start = get_bill_period_start_date().date()
 
 # -------------------------
 # Load and process data
 # -------------------------
-df_elec = pd.read_parquet('electricity_usage.parquet')
-df_elec['index'] = pd.to_datetime(df_elec['index'])
-df_elec['USAGE_DATE'] = df_elec['index'].dt.date
-df_elec['USAGE_START_TIME'] = df_elec['index'].dt.strftime('%H:%M')
-df_elec['DAY'] = df_elec['index'].dt.day
-df_elec['MONTH'] = df_elec['index'].dt.month
-df_elec['YEAR'] = df_elec['index'].dt.year
-df_elec['USAGE_KWH'] = df_elec['usage']
-df_elec['USAGE_COST'] = df_elec['dollars']
-
-df_gas = pd.read_parquet('gas_usage.parquet')
-df_gas['index'] = pd.to_datetime(df_gas['index'])
-df_gas['USAGE_DATE'] = df_gas['index'].dt.date
-df_gas['USAGE_START_TIME'] = df_gas['index'].dt.strftime('%H:%M')
-df_gas['DAY'] = df_gas['index'].dt.day
-df_gas['MONTH'] = df_gas['index'].dt.month
-df_gas['YEAR'] = df_gas['index'].dt.year
-df_gas['USAGE_KWH'] = df_gas['usage']
-df_gas['USAGE_COST'] = df_gas['dollars']
+def heatmap_fields(df):
+    """Usage rows with the column names used by the heatmap and bar charts."""
+    timestamp = pd.to_datetime(df['index'])
+    # Rebuilt with each data reload, which also picks up a new billing period
+    bill_period_start = get_bill_period_start_date().normalize()
+    return pd.DataFrame({
+        'index': timestamp,
+        'USAGE_DATE': timestamp.dt.date,
+        'USAGE_START_TIME': timestamp.dt.strftime('%H:%M'),
+        'DAY': timestamp.dt.day,
+        'MONTH': timestamp.dt.month,
+        'YEAR': timestamp.dt.year,
+        'USAGE_KWH': df['usage'],
+        'USAGE_COST': df['dollars'],
+        'Category': np.where(timestamp < bill_period_start, 'Paid', 'To be billed'),
+    })
+
+
+def daily_totals(df):
+    """Daily kWh and cost per billing category, shared by the year and month bar charts."""
+    daily = df.groupby(['USAGE_DATE', 'Category'])[['USAGE_KWH', 'USAGE_COST']].sum().reset_index()
+    daily['MONTH'] = pd.to_datetime(daily['USAGE_DATE']).dt.month
+    return daily
+
+
+def with_month(df):
+    return df.assign(MONTH=df['Time'].dt.month)
+
+
+data_registry.register_view('heatmap_electricity', heatmap_fields, ['electricity'])
+data_registry.register_view('heatmap_gas', heatmap_fields, ['gas'])
+# Computed once per data generation; the callback only slices them
+data_registry.register_view('heatmap_electricity_daily', daily_totals, ['heatmap_electricity'])
+data_registry.register_view('heatmap_gas_daily', daily_totals, ['heatmap_gas'])
+# Hourly and daily rollups maintained at ingest; the raw 10-minute readings aren't loaded
+data_registry.register_view('heatmap_temperature_hourly', with_month, ['temperature_hourly'])
+data_registry.register_view('heatmap_temperature_daily', with_month, ['temperature_daily'])
 
 elec_daily_fixed_charge = 0.90 # 90 cents per day
 gas_daily_fixed_charge = 1.5847 # 158.47 cents per day
@@ -54,25 +72,8 @@ gas_daily_fixed_charge = 1.5847 # 158.47 cents per day
 # Genesis Energy's website displays an hourly cost of 8c, but the bill shows a daily cost of 1.5847 NZD, 
 # so we use that for consistency
 
-forecast = check_forecast_electricty_data()
-# Access the monthly forecast
-monthly = forecast.get("monthly", {}).get("value")
-weekly = forecast.get("weekly", {}).get("value")
-
-# Create the categories
-df_elec['Category'] = df_elec['USAGE_DATE'].apply(lambda x: 'Paid' if x < bill_period_start else 'To be billed')
-df_gas['Category'] = df_gas['USAGE_DATE'].apply(lambda x: 'Paid' if x < bill_period_start else 'To be billed')
-  
-
-df_temp = pd.read_parquet('air_temperature.parquet')
-df_temp['Time'] = pd.to_datetime(df_temp['Time'], unit='ms')
-df_temp['DAY'] = df_temp['Time'].dt.day
-df_temp['MONTH'] = df_temp['Time'].dt.month
-df_temp['YEAR'] = df_temp['Time'].dt.year
-
-df_events = pd.read_csv('data/usage-appliances.csv')
-df_events = df_events[df_events['Appliance'] == "Dishwasher"]
-df_events['Timestamp'] = pd.to_datetime(df_events['Timestamp'])
+EVENTS_FILE = 'data/usage-appliances.csv'
+FORECAST_FILE = DOWNLOADS_FOLDER + "/forecasts.csv"
 
 # Enrich events with runtime and kWh estimates
 program_details = {
@@ -87,105 +88,249 @@ program_details = {
     "Short 60C": {"kWh": 1.05, "runtime": "1:29"},
 }
 
-df_events['kWh'] = df_events['Program'].map(lambda x: program_details.get(x, {"kWh": 1})['kWh'])
-df_events['Runtime'] = df_events['Program'].map(lambda x: program_details.get(x, {"runtime": "1:30"})['runtime'])
-df_events['Duration'] = pd.to_timedelta(df_events['Runtime'] + ':00')
-df_events['StartTime'] = df_events['Timestamp'] - df_events['Duration']
-df_events['Day'] = df_events['Timestamp'].dt.day
-df_events['Month'] = df_events['Timestamp'].dt.month
+
+def load_dishwasher_events():
+    df_events = pd.read_csv(EVENTS_FILE)
+    df_events = df_events[df_events['Appliance'] == "Dishwasher"].copy()
+    df_events['Timestamp'] = pd.to_datetime(df_events['Timestamp'])
+    df_events['kWh'] = df_events['Program'].map(lambda x: program_details.get(x, {"kWh": 1})['kWh'])
+    df_events['Runtime'] = df_events['Program'].map(lambda x: program_details.get(x, {"runtime": "1:30"})['runtime'])
+    df_events['Duration'] = pd.to_timedelta(df_events['Runtime'] + ':00')
+    df_events['StartTime'] = df_events['Timestamp'] - df_events['Duration']
+    df_events['Day'] = df_events['Timestamp'].dt.day
+    df_events['Month'] = df_events['Timestamp'].dt.month
+    return df_events
+
+
+# Read on the first visit to the page rather than at import, and again when the files change
+data_registry.register_dataset('forecast', check_forecast_electricty_data, [FORECAST_FILE])
+data_registry.register_dataset('dishwasher_events', load_dishwasher_events, [EVENTS_FILE])
+
+# -------------------------
+# Figures
+# -------------------------
+# The month-dependent figures are laid out once per page visit with empty traces; their
+# callbacks then patch in only the trace data and axis ranges of the selected month.
+def heatmap_figure(title, zmax, colorscale, markers=False):
+    fig = go.Figure(go.Heatmap(zmin=0, zmax=zmax, colorscale=colorscale))
+    if markers:
+        # Dishwasher finish times
+        fig.add_trace(go.Scatter(
+            mode='markers',
+            marker=dict(color='white', size=8, symbol='x'),
+            name='Dishwasher Finish',
+            hoverinfo='text',
+            showlegend=False
+        ))
+    fig.update_layout(title=title, xaxis=dict(dtick=1))
+    return fig
+
+
+def daily_cost_figure(title, colors):
+    # Two stacked bars for the paid days, then two for the days still to be billed
+    fig = go.Figure([go.Bar(marker_color=color) for color in colors])
+    fig.update_layout(
+        barmode='stack',
+        title=title,
+        xaxis_title='Date',
+        yaxis_title='$',
+        yaxis=dict(rangemode="tozero"),
+        showlegend=False
+    )
+    return fig
+
+
+def temperature_figure():
+    fig = go.Figure([
+        go.Scatter(mode='lines', name='Hourly Temp', line=dict(color='white', width=1)),
+        go.Bar(name='Daily Mean Temperature', marker=dict(color='green')),
+    ])
+    fig.update_layout(
+        title='Air Temperature (hourly)',
+        xaxis_title='Time',
+        yaxis_title='°C',
+        showlegend=False,
+    )
+    return fig
+
+
+def year_bar_figure(daily, colors, year):
+    fig = go.Figure([
+        go.Bar(x=daily[daily['Category'] == category]['USAGE_DATE'],
+               y=daily[daily['Category'] == category]['USAGE_KWH'],
+               marker_color=color)
+        for category, color in zip(('Paid', 'To be billed'), colors)
+    ])
+    fig.update_layout(
+        yaxis_title='kWh',
+        yaxis=dict(rangemode="tozero"),
+        xaxis=dict(range=[datetime(year, 1, 1), datetime(year, 12, 31)]),
+        height=100,
+        margin=dict(t=0, b=0),
+        showlegend=False
+    )
+    return fig
+
+
+def month_days(daily, month):
+    """Rows of a daily totals view for the selected month."""
+    return daily[daily['MONTH'] == month].reset_index(drop=True)
+
+
+def month_range(year, month):
+    return [datetime(year, month, 1), datetime(year, month, calendar.monthrange(year, month)[1])]
+
+
+def patch_temperature_line(patch, times, values, title):
+    # At most MAX_POINTS per trace, drawn with WebGL when still dense
+    keep = lttb(times, values, MAX_POINTS)
+    patch['data'][0]['type'] = line_type(len(keep))
+    patch['data'][0]['x'] = times.iloc[keep]
+    patch['data'][0]['y'] = values.iloc[keep]
+    patch['layout']['title']['text'] = title
+
+
+def zoom_range(relayout):
+    """(start, end) of the x-axis after a zoom or pan, or None for any other relayout."""
+    relayout = relayout or {}
+    if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        return relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    if 'xaxis.range' in relayout:
+        return tuple(relayout['xaxis.range'])
+    return None
+
+
+def cost_labels(costs):
+    return costs.apply(lambda x: f"${x:.2f}" if x > 0 else "")
+
+
+def patch_heatmap(patch, dfm, year, month):
+    hourly = dfm.groupby(['DAY', 'USAGE_START_TIME'])['USAGE_KWH'].mean().reset_index()
+    heatmap_data = hourly.pivot(index='USAGE_START_TIME', columns='DAY', values='USAGE_KWH')
+    patch['data'][0]['z'] = heatmap_data.values
+    patch['data'][0]['x'] = heatmap_data.columns
+    patch['data'][0]['y'] = heatmap_data.index
+    patch['layout']['xaxis']['range'] = [1, calendar.monthrange(year, month)[1]]
+
+
+def patch_bars(patch, bars, year, month):
+    """Fill a daily_cost_figure from (x, lower, upper, labels) for the paid days, then the days to be billed."""
+    for offset, (x, lower, upper, labels) in zip((0, 2), bars):
+        patch['data'][offset]['x'] = x
+        patch['data'][offset]['y'] = lower
+        patch['data'][offset + 1]['x'] = x
+        patch['data'][offset + 1]['y'] = upper
+        patch['data'][offset + 1]['text'] = cost_labels(labels)
+    patch['layout']['xaxis']['range'] = month_range(year, month)
+
+
+def fixed_charge_bars(daily, fixed_charge):
+    """Daily cost split into the fixed charge and the rest, per billing category."""
+    bars = []
+    for category in ('Paid', 'To be billed'):
+        days = daily[daily['Category'] == category]
+        bars.append((days['USAGE_DATE'], np.full(len(days), fixed_charge),
+                     days['USAGE_COST'] - fixed_charge, days['USAGE_COST']))
+    return bars
+
 
 # -------------------------
 # Layout
 # -------------------------
-layout = dbc.Container([
-    html.H3("Power & Gas Usage", className="text-center my-4"),
-
-    dcc.Dropdown(
-        id="slct_month",
-        options=[{"label": calendar.month_name[i], "value": i} for i in range(1, 13)],
-        value=datetime.now().month,
-        style={"width": "40%", "color": "black"}  # override dark theme
-    ),
-    html.Br(),
-    
-    dbc.Row([
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Electric Cost", className="card-title"),
-                html.H3(id="total_cost", className="card-text")
-            ])
-        ], color="warning", inverse=True), md=2),
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Gas Cost", className="card-title"),
-                html.H3(id="gas_cost", className="card-text")
-            ])
-        ], color="secondary", inverse=True), md=2),
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Bill to date", className="card-title"),
-                html.H3(id="bill_to_date", className="card-text")
-            ])
-        ], color="primary", inverse=True), md=2),
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Monthly Bill Forecast", className="card-title"),
-                html.H3(id="monthly", className="card-text")
-            ])
-        ], color="success", inverse=True), md=2),
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Weekly ⚡ Forecast", className="card-title"),
-                html.H3(id="weekly", className="card-text")
-            ])
-        ], color="success", inverse=True), md=2),
-        dbc.Col(dbc.Card([
-            dbc.CardBody([
-                html.H5("Avg Daily Temp", className="card-title"),
-                html.H3(id="avg_temp", className="card-text")
-            ])
-        ], color="info", inverse=True), md=2),
-    ]),
-    html.Br(),
-
-
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="year_bar_fig"), md=12),
-    ]),
-    html.Br(),
-    
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="gas_year_bar_fig"), md=12),
-    ]),
-    html.Br(),
-            
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="heatmap_fig"), md=6),
-        dbc.Col(dcc.Graph(id="bar_fig"), md=6)
-    ]),
-
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="gas_heatmap_fig"), md=6),
-        dbc.Col(dcc.Graph(id="gas_bar_fig"), md=6)
-    ]),
-    
-    dbc.Row([
-        dbc.Col(dcc.Graph(id="temp_fig"), md=6),
-        dbc.Col(dcc.Graph(id="elec_gas_bar_fig"), md=6)
-    ]) # , 
-    # html.Br(),
-    # dash.html.Iframe(
-    #     src="https://embed.windy.com/embed.html?type=map&location=coordinates&metricRain=mm&metricTemp=°C&metricWind=km/h&zoom=9&overlay=wind&product=ecmwf&level=surface&lat=-39.37&lon=174.298",  # Replace with your Windy embed URL
-    #     style={'width': '80%', 'height': '450px'}
-    # )
-], fluid=True)
+def card(title, output_id, color):
+    return dbc.Col(dbc.Card([
+        dbc.CardBody([
+            html.H5(title, className="card-title"),
+            html.H3(id=output_id, className="card-text")
+        ])
+    ], color=color, inverse=True), md=2)
+
+
+# Built on every page visit, so the dropdown and year follow today's date
+def layout(**kwargs):
+    now = datetime.now()
+    return dbc.Container([
+        dcc.Store(id="heatmap_year", data=now.year),
+        html.H3("Power & Gas Usage", className="text-center my-4"),
+
+        dcc.Dropdown(
+            id="slct_month",
+            options=[{"label": calendar.month_name[i], "value": i} for i in range(1, 13)],
+            value=now.month,
+            style={"width": "40%", "color": "black"}  # override dark theme
+        ),
+        html.Br(),
+
+        dbc.Row([
+            card("Electric Cost", "total_cost", "warning"),
+            card("Gas Cost", "gas_cost", "secondary"),
+            card("Bill to date", "bill_to_date", "primary"),
+            card("Monthly Bill Forecast", "monthly", "success"),
+            card("Weekly ⚡ Forecast", "weekly", "success"),
+            card("Avg Daily Temp", "avg_temp", "info"),
+        ]),
+        html.Br(),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="year_bar_fig"), md=12),
+        ]),
+        html.Br(),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="gas_year_bar_fig"), md=12),
+        ]),
+        html.Br(),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="heatmap_fig",
+                              figure=heatmap_figure('Hourly Electricity Usage', 2.5, 'hot', markers=True)), md=6),  # 'YlOrRd_r', 'Viridis'
+            dbc.Col(dcc.Graph(id="bar_fig", figure=daily_cost_figure(
+                'Daily Electricity Cost', ['khaki', 'orange', 'lightgoldenrodyellow', 'navajowhite'])), md=6)
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="gas_heatmap_fig", figure=heatmap_figure('Hourly Gas Usage', 10, 'Viridis')), md=6),
+            dbc.Col(dcc.Graph(id="gas_bar_fig", figure=daily_cost_figure(
+                'Daily Gas Cost', ['khaki', 'darkgrey', 'lightgoldenrodyellow', 'white'])), md=6)
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id="temp_fig", figure=temperature_figure()), md=6),
+            dbc.Col(dcc.Graph(id="elec_gas_bar_fig", figure=daily_cost_figure(
+                'Daily Energy Cost', ['orange', 'darkgrey', 'lightgoldenrodyellow', 'white'])), md=6)
+        ]) # ,
+        # html.Br(),
+        # dash.html.Iframe(
+        #     src="https://embed.windy.com/embed.html?type=map&location=coordinates&metricRain=mm&metricTemp=°C&metricWind=km/h&zoom=9&overlay=wind&product=ecmwf&level=surface&lat=-39.37&lon=174.298",  # Replace with your Windy embed URL
+        #     style={'width': '80%', 'height': '450px'}
+        # )
+    ], fluid=True)
 
 # -------------------------
-# Callback
+# Callbacks
 # -------------------------
+# Independent units, each memoized: the browser requests them in parallel, and a month change
+# doesn't touch the year-wide charts or the forecast.
 @callback(
     Output("monthly", "children"),
     Output("weekly", "children"),
+    Output("year_bar_fig", "figure"),
+    Output("gas_year_bar_fig", "figure"),
+    Input("heatmap_year", "data")
+)
+@memoize()
+def update_year(year):
+    forecast, elec_daily, gas_daily = data_registry.frames(
+        'forecast', 'heatmap_electricity_daily', 'heatmap_gas_daily')
+    # Access the monthly forecast
+    monthly = forecast.get("monthly", {}).get("value")
+    weekly = forecast.get("weekly", {}).get("value")
+    return (f"${monthly:.2f}", f"${weekly:.2f}",
+            year_bar_figure(elec_daily, ['orange', 'navajowhite'], year),
+            year_bar_figure(gas_daily, ['darkgrey', 'white'], year))
+
+
+@callback(
     Output("total_cost", "children"),
 #    Output("total_kwh", "children"),
     Output("gas_cost", "children"),
@@ -193,349 +338,150 @@ layout = dbc.Container([
     Output("avg_temp", "children"),
     Output("bill_to_date", "children"),
 #    Output("dish_count", "children"),
-    Output("year_bar_fig", "figure"),
-    Output("gas_year_bar_fig", "figure"),
-    Output("heatmap_fig", "figure"),
-    Output("bar_fig", "figure"),
-    Output("gas_heatmap_fig", "figure"),
-    Output("gas_bar_fig", "figure"),
-    Output("temp_fig", "figure"),
-    Output("elec_gas_bar_fig", "figure"),
     Input("slct_month", "value")
 )
-
-def update_dashboard(selected_month):
-    # Filter
+@memoize()
+def update_cards(selected_month):
+    # All frames come from the same data generation, even during a reload
+    df_elec, df_gas, elec_daily, gas_daily, df_temp_daily = data_registry.frames(
+        'heatmap_electricity', 'heatmap_gas', 'heatmap_electricity_daily', 'heatmap_gas_daily',
+        'heatmap_temperature_daily')
     dfm_elec = df_elec[df_elec["MONTH"] == selected_month]
     dfm_gas = df_gas[df_gas["MONTH"] == selected_month]
-    dfm_temp = df_temp[df_temp["MONTH"] == selected_month]
-    dfm_events = df_events[df_events["Month"] == selected_month]
-    
-    year = datetime.now().year
-    
-    elec_daily = df_elec.groupby(['USAGE_DATE','Category'])['USAGE_KWH'].sum().reset_index()
-    gas_daily = df_gas.groupby(['USAGE_DATE','Category'])['USAGE_KWH'].sum().reset_index()
-        
-    first_day = datetime(year, 1, 1)
-    last_day = datetime(year, 12, calendar.monthrange(year, selected_month)[1])
-    
-    # elec_last_P7D = dfm_elec['USAGE_DATE'].max() - timedelta(days=7)
-    # elec_last_P14D = dfm_elec['USAGE_DATE'].max() - timedelta(days=14)
-
-    # elec_usage_last_7_days = dfm_elec[dfm_elec['USAGE_DATE'] >= elec_last_P7D]['USAGE_KWH'].sum()
-    # elec_usage_prior_7_days = dfm_elec[dfm_elec['USAGE_DATE'] >= elec_last_P14D]['USAGE_KWH'].sum() - elec_usage_last_7_days
-
-    year_bar_fig = go.Figure(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_KWH'],
-        marker_color='orange',
-    ))
-    
-    # Add bars for "To be billed" category
-    year_bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_KWH'],
-        marker_color='navajowhite',
-    ))
-    
-    year_bar_fig.update_layout(
-        yaxis_title='kWh',
-        yaxis=dict(rangemode="tozero"),
-        xaxis=dict(range=[first_day, last_day]),
-        height=100,
-        margin=dict(t=0, b=0),
-        showlegend=False
-    )
-
-    gas_year_bar_fig = go.Figure(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_KWH'],
-        marker_color='darkgrey',
-    ))
-
-    # Add bars for "To be billed" category
-    gas_year_bar_fig.add_trace(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_KWH'],
-        marker_color='white',
-    ))
-
-    gas_year_bar_fig.update_layout(
-        yaxis_title='kWh',
-        yaxis=dict(rangemode="tozero"),
-        xaxis=dict(range=[first_day, last_day]),
-        height=100,
-        margin=dict(t=0, b=0),
-        showlegend=False
-    )
-    
-    first_day = datetime(year, selected_month, 1)
-    last_day = datetime(year, selected_month, calendar.monthrange(year, selected_month)[1])
+    elec_daily = month_days(elec_daily, selected_month)
+    gas_daily = month_days(gas_daily, selected_month)
 
     # Big numbers
     total_cost = round(dfm_elec["USAGE_COST"].sum(), 1)
-    total_kwh = round(dfm_elec["USAGE_KWH"].sum(), 1)
     gas_cost = round(dfm_gas["USAGE_COST"].sum(), 1)
-    gas_kwh = round(dfm_gas["USAGE_KWH"].sum(), 1)
-    
+
     # To be billed amounts
-    elec_to_be_billed_kwh = round(dfm_elec[dfm_elec['USAGE_DATE'] >= bill_period_start]["USAGE_KWH"].sum(), 1)
-    elec_to_be_billed_cost = round(dfm_elec[dfm_elec['USAGE_DATE'] >= bill_period_start]["USAGE_COST"].sum(), 1)
-    gas_to_be_billed_kwh = round(dfm_gas[dfm_gas['USAGE_DATE'] >= bill_period_start]["USAGE_KWH"].sum(), 1)
-    gas_to_be_billed_cost = round(dfm_gas[dfm_gas['USAGE_DATE'] >= bill_period_start]["USAGE_COST"].sum(), 1)
-    # print(f"Electricity to be billed: {elec_to_be_billed_kwh} kWh, ${elec_to_be_billed_cost}")
-    # print(f"Gas to be billed: {gas_to_be_billed_kwh} kWh, ${gas_to_be_billed_cost}")
+    elec_to_be_billed_kwh = round(dfm_elec[dfm_elec['Category'] == 'To be billed']["USAGE_KWH"].sum(), 1)
+    elec_to_be_billed_cost = round(dfm_elec[dfm_elec['Category'] == 'To be billed']["USAGE_COST"].sum(), 1)
+    gas_to_be_billed_kwh = round(dfm_gas[dfm_gas['Category'] == 'To be billed']["USAGE_KWH"].sum(), 1)
+    gas_to_be_billed_cost = round(dfm_gas[dfm_gas['Category'] == 'To be billed']["USAGE_COST"].sum(), 1)
     if elec_to_be_billed_kwh > 0:
         total_cost = elec_to_be_billed_cost
-        total_kwh = elec_to_be_billed_kwh
     if gas_to_be_billed_kwh > 0:
         gas_cost = gas_to_be_billed_cost
-        gas_kwh = gas_to_be_billed_kwh
 
+    avg_temp = round(df_temp_daily[df_temp_daily["MONTH"] == selected_month]['mean'].mean(), 1)
 
+    bill_to_date = (elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_COST'].sum()
+                    + gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_COST'].sum())
 
-    if 'Time' in dfm_temp.columns:
-        avg_temp = round(dfm_temp.resample('D', on='Time')['Value'].mean().mean(), 1)
-    else:
-        avg_temp = round(dfm_temp.resample('D')['Value'].mean().mean(), 1)
+    return f"${total_cost:.2f}", f"${gas_cost:.2f}", f"{avg_temp}°C", f"{bill_to_date:.2f}"
 
-    dish_count = len(dfm_events)
 
-    # Heatmap
-    hourly = dfm_elec.groupby(['DAY', 'USAGE_START_TIME'])['USAGE_KWH'].mean().reset_index()
-    heatmap_data = hourly.pivot(index='USAGE_START_TIME', columns='DAY', values='USAGE_KWH')
-    heatmap_fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data.values, zmin=0, zmax=2.5,
-        x=heatmap_data.columns,
-        y=heatmap_data.index,
-        colorscale='hot', #'YlOrRd_r', # 'Viridis'
-    ))
-    
-    # Overlay event markers
-    # Align to heatmap y-axis
-    dfm_events['Heatmap_Time'] = dfm_events['Timestamp'].dt.floor('60min').dt.strftime('%H:%M')
-
-    heatmap_fig.add_trace(go.Scatter(
-        x=dfm_events['Day'],
-        y=dfm_events['Heatmap_Time'],
-        mode='markers',
-        marker=dict(color='white', size=8, symbol='x'),
-        name='Dishwasher Finish',
-        hovertext=dfm_events.apply(lambda row: f"{row['Timestamp'].strftime('%Y-%m-%d %H:%M')}<br>Program: {row['Program']}<br>kWh: {row['kWh']}", axis=1),
-        hoverinfo='text',
-        showlegend=False
-    ))
-    
-    heatmap_fig.update_layout(
-        title='Hourly Electricity Usage',
-        xaxis=dict(range=[1, calendar.monthrange(year, selected_month)[1]], dtick=1)
-    )
+@callback(
+    Output("heatmap_fig", "figure"),
+    Output("bar_fig", "figure"),
+    Input("slct_month", "value"),
+    Input("heatmap_year", "data")
+)
+@memoize()
+def update_electricity(selected_month, year):
+    df_elec, elec_daily, df_events = data_registry.frames(
+        'heatmap_electricity', 'heatmap_electricity_daily', 'dishwasher_events')
+    dfm_elec = df_elec[df_elec["MONTH"] == selected_month]
+    dfm_events = df_events[df_events["Month"] == selected_month]
 
-    # Bar chart for Select Month - Daily Totals
-    elec_daily = dfm_elec.groupby(['USAGE_DATE','Category'])['USAGE_KWH'].sum().reset_index()
-    elec_daily = dfm_elec.groupby(['USAGE_DATE','Category'])['USAGE_COST'].sum().reset_index()
-    elec_daily['FIXED_CHARGE'] = elec_daily_fixed_charge
-    elec_daily['ELEC_COST'] = elec_daily['USAGE_COST'] - elec_daily['FIXED_CHARGE']  # Subtract fixed charge to daily cost
-    
-    bar_fig = go.Figure(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'Paid']['FIXED_CHARGE'],
-        marker_color='khaki',  # Use a different color for the fixed charge
-
-    ))
-
-    bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'Paid']['ELEC_COST'],
-        marker_color='orange',
-        text=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-
-    ))
-
-    # Add bars for "To be billed" category
-    
-    bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'To be billed']['FIXED_CHARGE'],
-        marker_color='lightgoldenrodyellow',  # Use a different color for the fixed charge
-
-    ))
-    
-    bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'To be billed']['ELEC_COST'],
-        marker_color='navajowhite',
-        text=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-    ))
-    
-    bar_fig.update_layout(
-        barmode='stack',
-        title='Daily Electricity Cost', 
-        xaxis_title='Date', 
-        yaxis_title='$',
-        yaxis=dict(rangemode="tozero"),
-        xaxis=dict(range=[first_day, last_day]),
-        showlegend=False
-    )
+    heatmap_fig = Patch()
+    patch_heatmap(heatmap_fig, dfm_elec, year, selected_month)
+    # Overlay event markers, aligned to the heatmap y-axis
+    heatmap_fig['data'][1]['x'] = dfm_events['Day']
+    heatmap_fig['data'][1]['y'] = dfm_events['Timestamp'].dt.floor('60min').dt.strftime('%H:%M')
+    heatmap_fig['data'][1]['hovertext'] = [
+        f"{row['Timestamp'].strftime('%Y-%m-%d %H:%M')}<br>Program: {row['Program']}<br>kWh: {row['kWh']}"
+        for _, row in dfm_events.iterrows()]
 
+    # Bar chart for Select Month - Daily Totals
+    bar_fig = Patch()
+    patch_bars(bar_fig, fixed_charge_bars(month_days(elec_daily, selected_month), elec_daily_fixed_charge),
+               year, selected_month)
+    return heatmap_fig, bar_fig
 
-    # Gas Heatmap
-    gas_hourly = dfm_gas.groupby(['DAY', 'USAGE_START_TIME'])['USAGE_KWH'].mean().reset_index()
-    gas_heatmap_data = gas_hourly.pivot(index='USAGE_START_TIME', columns='DAY', values='USAGE_KWH')
-    gas_heatmap_fig = go.Figure(data=go.Heatmap(
-        z=gas_heatmap_data.values,zmin=0, zmax=10,
-        x=gas_heatmap_data.columns,
-        y=gas_heatmap_data.index,
-        colorscale='Viridis'
-    ))
-    
-    gas_heatmap_fig.update_layout(
-        title='Hourly Gas Usage',
-        xaxis=dict(range=[1, calendar.monthrange(year, selected_month)[1]], dtick=1)
-    )
 
-    # Bar chart
-    gas_daily = dfm_gas.groupby(['USAGE_DATE','Category'])['USAGE_KWH'].sum().reset_index()
-    gas_daily = dfm_gas.groupby(['USAGE_DATE','Category'])['USAGE_COST'].sum().reset_index()
-    gas_daily['FIXED_CHARGE'] = gas_daily_fixed_charge
-    gas_daily['GAS_COST'] = gas_daily['USAGE_COST'] - gas_daily['FIXED_CHARGE']  # Subtract fixed charge to daily cost
-    elec_daily['ENERGY_COST'] = elec_daily['USAGE_COST'] + gas_daily['USAGE_COST']  # Total cost for both energy sources
-    
-    bill_to_date = elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_COST'].sum() + gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_COST'].sum()
-        
-    
-    gas_bar_fig = go.Figure(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'Paid']['FIXED_CHARGE'],
-        marker_color='khaki',  # Use a different color for the fixed charge
-
-    ))
-
-    gas_bar_fig.add_trace(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'Paid']['GAS_COST'],
-        marker_color='darkgrey',
-        text=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-
-    ))
-
-    # Add bars for "To be billed" category
-    
-    gas_bar_fig.add_trace(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'To be billed']['FIXED_CHARGE'],
-        marker_color='lightgoldenrodyellow',  # Use a different color for the fixed charge
-
-    ))
-    
-    gas_bar_fig.add_trace(go.Bar(
-        x=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'To be billed']['GAS_COST'],
-        marker_color='white',
-        text=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-    ))
-    
-    gas_bar_fig.update_layout(
-        barmode='stack',
-        title='Daily Gas Cost', 
-        xaxis_title='Date', 
-        yaxis_title='$',
-        yaxis=dict(rangemode="tozero"),
-        xaxis=dict(range=[first_day, last_day]),
-        showlegend=False
-    )
+@callback(
+    Output("gas_heatmap_fig", "figure"),
+    Output("gas_bar_fig", "figure"),
+    Input("slct_month", "value"),
+    Input("heatmap_year", "data")
+)
+@memoize()
+def update_gas(selected_month, year):
+    df_gas, gas_daily = data_registry.frames('heatmap_gas', 'heatmap_gas_daily')
+    gas_heatmap_fig = Patch()
+    patch_heatmap(gas_heatmap_fig, df_gas[df_gas["MONTH"] == selected_month], year, selected_month)
 
+    gas_bar_fig = Patch()
+    patch_bars(gas_bar_fig, fixed_charge_bars(month_days(gas_daily, selected_month), gas_daily_fixed_charge),
+               year, selected_month)
+    return gas_heatmap_fig, gas_bar_fig
 
-    # Temperature
-    temp_fig = go.Figure()
-    temp_fig.add_trace(go.Scatter(
-        x=dfm_temp['Time'], 
-        y=dfm_temp['Value'], 
-        mode='lines', 
-        name='10-min Temp',
-        line=dict(color='white', width=1)
-    ))
-    
-        # Daily means
-    dff_temp_copy = dfm_temp.copy()
-    dff_temp_copy.set_index('Time', inplace=True)
-    daily_means = dff_temp_copy['Value'].resample('D').mean().dropna().reset_index()
-
-    temp_fig.add_trace(go.Bar(
-        x=daily_means['Time'],
-        y=daily_means['Value'],
-        name='Daily Mean Temperature',
-        marker=dict(color='green')
-    ))
-    
-    temp_fig.update_layout(
-        title='Air Temperature (10-min)', 
-        xaxis_title='Time', 
-        yaxis_title='°C',
-        xaxis=dict(range=[first_day, last_day]),
-        showlegend=False,
-    )
 
-    # Dishwasher event timeline
-    timeline_fig = go.Figure()
-    for _, row in dfm_events.iterrows():
-        timeline_fig.add_trace(go.Scatter(
-            x=[row['StartTime'], row['Timestamp']],
-            y=[row['Program']]*2,
-            mode='lines+markers',
-            name=row['Program'],
-            line=dict(width=4),
-            hovertext=f"{row['Program']}, {row['kWh']} kWh",
-            showlegend=False
-        ))
-    timeline_fig.update_layout(
-        title='Dishwasher Program Timeline', 
-        xaxis_title='Time', 
-        yaxis_title='Program',
-        xaxis=dict(range=[first_day, last_day]),
-        showlegend=False,)
-
-
-# Power and Gas total cost
-    elec_gas_bar_fig = go.Figure(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_COST'],
-        marker_color='orange',  # Use a different color for the fixed charge
-
-    ))
-
-    elec_gas_bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'Paid']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'Paid']['USAGE_COST'],
-        marker_color='darkgrey',
-        text=elec_daily[elec_daily['Category'] == 'Paid']['ENERGY_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-    ))
-
-    # Add bars for "To be billed" category
-    
-    elec_gas_bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_COST'],
-        marker_color='lightgoldenrodyellow',  # Use a different color for the fixed charge
-
-    ))
-    
-    elec_gas_bar_fig.add_trace(go.Bar(
-        x=elec_daily[elec_daily['Category'] == 'To be billed']['USAGE_DATE'], 
-        y=gas_daily[gas_daily['Category'] == 'To be billed']['USAGE_COST'],
-        marker_color='white',
-        text=elec_daily[elec_daily['Category'] == 'To be billed']['ENERGY_COST'].apply(lambda x: f"${x:.2f}" if x > 0 else "")
-    ))
-    
-    elec_gas_bar_fig.update_layout(
-        barmode='stack',
-        title='Daily Energy Cost', 
-        xaxis_title='Date', 
-        yaxis_title='$',
-        yaxis=dict(rangemode="tozero"),
-        xaxis=dict(range=[first_day, last_day]),
-        showlegend=False
-    )
+@callback(
+    Output("temp_fig", "figure"),
+    Input("slct_month", "value"),
+    Input("heatmap_year", "data")
+)
+@memoize()
+def update_temperature(selected_month, year):
+    df_temp_hourly, df_temp_daily = data_registry.frames('heatmap_temperature_hourly', 'heatmap_temperature_daily')
+    dfm_temp_hourly = df_temp_hourly[df_temp_hourly["MONTH"] == selected_month]
+    dfm_temp_daily = df_temp_daily[df_temp_daily["MONTH"] == selected_month]
+
+    temp_fig = Patch()
+    hourly = dfm_temp_hourly.dropna(subset=['mean'])
+    patch_temperature_line(temp_fig, hourly['Time'], hourly['mean'], 'Air Temperature (hourly)')
+    # Daily means
+    temp_fig['data'][1]['x'] = dfm_temp_daily['Time']
+    temp_fig['data'][1]['y'] = dfm_temp_daily['mean']
+    temp_fig['layout']['xaxis']['range'] = month_range(year, selected_month)
+    return temp_fig
+
+
+# Zooming in swaps the hourly means for the 10-minute readings of the visible range
+@callback(
+    Output("temp_fig", "figure", allow_duplicate=True),
+    Input("temp_fig", "relayoutData"),
+    State("slct_month", "value"),
+    State("heatmap_year", "data"),
+    prevent_initial_call=True
+)
+@memoize()
+def zoom_temperature(relayout, selected_month, year):
+    visible = zoom_range(relayout)
+    if visible is None:
+        if not (relayout or {}).get('xaxis.autorange'):
+            raise PreventUpdate
+        # Zoomed back out
+        return update_temperature(selected_month, year)
+    readings = read_air_temperature(*visible, columns=['Value']).dropna(subset=['Value'])
+    temp_fig = Patch()
+    patch_temperature_line(temp_fig, readings['Time'], readings['Value'], 'Air Temperature (10-minute)')
+    return temp_fig
 
-    return f"${monthly:.2f}",f"${weekly:.2f}",f"${total_cost:.2f}",f"${gas_cost:.2f}", f"{avg_temp}°C", f"{bill_to_date:.2f}", year_bar_fig, gas_year_bar_fig, heatmap_fig, bar_fig, gas_heatmap_fig, gas_bar_fig, temp_fig, elec_gas_bar_fig # f"{total_kwh} kWh", f"{gas_kwh} kWh", f"{dish_count}", 
 
+@callback(
+    Output("elec_gas_bar_fig", "figure"),
+    Input("slct_month", "value"),
+    Input("heatmap_year", "data")
+)
+@memoize()
+def update_energy_cost(selected_month, year):
+    # Power and Gas total cost
+    elec_daily, gas_daily = data_registry.frames('heatmap_electricity_daily', 'heatmap_gas_daily')
+    elec_daily = month_days(elec_daily, selected_month)
+    gas_daily = month_days(gas_daily, selected_month)
+    # Gas costs are stacked on the electricity dates, day by day
+    energy_cost = elec_daily['USAGE_COST'] + gas_daily['USAGE_COST'].reindex(elec_daily.index)
+    bars = []
+    for category in ('Paid', 'To be billed'):
+        elec = elec_daily['Category'] == category
+        gas = gas_daily['Category'] == category
+        bars.append((elec_daily[elec]['USAGE_DATE'], elec_daily[elec]['USAGE_COST'],
+                     gas_daily[gas]['USAGE_COST'], energy_cost[elec]))
+    elec_gas_bar_fig = Patch()
+    patch_bars(elec_gas_bar_fig, bars, year, selected_month)
+    return elec_gas_bar_fig
@@ -3,62 +3,56 @@ from dash import dcc
 from dash import html, callback
 from dash.dependencies import Input, Output
 import dash_bootstrap_components as dbc
+import functools
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.io as pio
+import data_registry
+from callback_cache import memoize
+from usage_cube import build_weekday_tensor
 
-# Use dark theme
-pio.templates.default = "plotly_dark"
 
 # --- 1. Load and Process Both Data Files ---
-# Assuming 'gas_usage.parquet' and 'electricity_usage.parquet' exist in the same directory
-try:
-    gas_df = pd.read_parquet("gas_usage.parquet")
-except FileNotFoundError:
-    print("Error: 'gas_usage.parquet' not found. Please ensure it's in the same directory.")
+# Read through the partitioned usage stores (or the legacy Parquet files before migration).
+# The registry keeps each source as a weekday x occurrence x hour tensor (see
+# usage_cube.build_weekday_tensor) and swaps in a new one after main.py has run, so it is
+# fetched per callback. The arrays are shared and must not be modified.
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+OCCURRENCE_CHOICES = [6, 12, 26, 52]
+# Past this many days, one grid of small multiples instead of a full-width graph per day
+SMALL_MULTIPLES_AFTER = 6
+SMALL_MULTIPLES_COLUMNS = 4
+
+
+@functools.lru_cache(maxsize=None)
+def dummy_usage(source):
+    print(f"Error: no {source} usage data found. Please run main.py to build the '{source}_usage' store.")
     # Create a dummy dataframe for testing if file is missing
     from datetime import datetime, timedelta
+    cycle, offset, rate = (100, 10, 0.15) if source == 'gas' else (120, 5, 0.25)
     data = []
     start_date = datetime.now() - timedelta(days=5*30) # 5 months ago
     for i in range(5*30*24): # 5 months of hourly data
         current_datetime = start_date + timedelta(hours=i)
         data.append({
             'index': current_datetime.timestamp() * 1000, # ms since epoch
-            'usage': i % 100 + 10, # Ensure non-zero usage
-            'dollars': ((i % 100) + 10) * 0.15 # Ensure non-zero dollars
+            'usage': i % cycle + offset, # Ensure non-zero usage
+            'dollars': ((i % cycle) + offset) * rate # Ensure non-zero dollars
         })
-    gas_df = pd.DataFrame(data)
-
-try:
-    elec_df = pd.read_parquet("electricity_usage.parquet")
-except FileNotFoundError:
-    print("Error: 'electricity_usage.parquet' not found. Please ensure it's in the same directory.")
-    # Create a dummy dataframe for testing if file is missing
-    from datetime import datetime, timedelta
-    data = []
-    start_date = datetime.now() - timedelta(days=5*30) # 5 months ago
-    for i in range(5*30*24): # 5 months of hourly data
-        current_datetime = start_date + timedelta(hours=i)
-        data.append({
-            'index': current_datetime.timestamp() * 1000, # ms since epoch
-            'usage': (i % 120) + 5, # Ensure non-zero usage
-            'dollars': ((i % 120) + 5) * 0.25 # Ensure non-zero dollars
-        })
-    elec_df = pd.DataFrame(data)
+    return process_df(pd.DataFrame(data))
 
 
 def process_df(df_input):
-    df_output = df_input.copy()
-    df_output["timestamp"] = pd.to_datetime(df_output["index"], unit="ms")
-    df_output['weekday'] = df_output['timestamp'].dt.day_name()
-    df_output["hour"] = df_output["timestamp"].dt.hour
-    df_output['date'] = df_output['timestamp'].dt.date
-    return df_output
-
-processed_dfs = {
-    'gas': process_df(gas_df),
-    'electricity': process_df(elec_df)
-}
+    # Registry tensors are built from the stores; only the dummy data goes through here
+    return build_weekday_tensor(df_input.assign(index=pd.to_datetime(df_input["index"], unit="ms")))
+
+
+def load_usage(source):
+    try:
+        return data_registry.get(f"{source}_weekdays")
+    except FileNotFoundError:
+        return dummy_usage(source)
+
 
 # print("Processed Gas DataFrame Head:")
 # print(processed_dfs['gas'].head())
@@ -105,16 +99,48 @@ layout = html.Div([
                 html.Label("Select Weekday:"),
                 dcc.Dropdown(
                     id='weekday-selector',
-                    options=[{'label': i, 'value': i} for i in processed_dfs['gas']['weekday'].unique()],
+                    options=[{'label': i, 'value': i} for i in WEEKDAYS],
                     value='Sunday',
                     style={"width": "70%", "color": "black"}  # override dark theme
                 ),
-            ], width=4),
+            ], width=2),
+            dbc.Col([
+                html.Label("Show Last:"),
+                dcc.Dropdown(
+                    id='occurrence-selector',
+                    options=[{'label': f"{n} weeks", 'value': n} for n in OCCURRENCE_CHOICES],
+                    value=OCCURRENCE_CHOICES[0],
+                    clearable=False,
+                    style={"width": "70%", "color": "black"}  # override dark theme
+                ),
+            ], width=2),
         ]),
     ]),
     html.Div(id='graph-container')
 ])
 
+def small_multiples(dates, profiles, ymax, columns=SMALL_MULTIPLES_COLUMNS):
+    """One bar chart of the 24 hours per date, in a grid of columns sharing both axes."""
+    rows = -(-len(dates) // columns)
+    h_gap, v_gap = 0.02, min(0.3 / rows, 0.08)
+    width, height = (1 - (columns - 1) * h_gap) / columns, (1 - (rows - 1) * v_gap) / rows
+    # Laid out by hand: make_subplots validates every axis and takes ~0.5 s for 52 cells
+    traces, layout, titles = [], {}, []
+    for i, (date, profile) in enumerate(zip(dates, profiles)):
+        row, col, n = i // columns, i % columns, str(i + 1) if i else ''
+        left, top = col * (width + h_gap), 1 - row * (height + v_gap)
+        traces.append(go.Bar(x=np.arange(24), y=profile, xaxis=f'x{n}', yaxis=f'y{n}',
+                             marker_color='#636efa', showlegend=False))
+        layout[f'xaxis{n}'] = {'domain': [left, left + width], 'anchor': f'y{n}', 'dtick': 6,
+                               'matches': 'x' if i else None}
+        layout[f'yaxis{n}'] = {'domain': [top - height, top], 'anchor': f'x{n}', 'range': [0, ymax],
+                               'showticklabels': col == 0}
+        titles.append({'text': str(date), 'x': left + width / 2, 'y': top, 'xref': 'paper', 'yref': 'paper',
+                       'xanchor': 'center', 'yanchor': 'bottom', 'showarrow': False, 'font': {'size': 11}})
+    return go.Figure(data=traces, layout=dict(layout, annotations=titles, height=160 * rows + 100,
+                                               margin=dict(t=80, b=30)))
+
+
 # --- Callbacks ---
 
 # Callback to update weekday dropdown options based on selected data source
@@ -122,54 +148,57 @@ layout = html.Div([
     Output('weekday-selector', 'options'),
     [Input('data-source-selector', 'value')]
 )
+@memoize()
 def set_weekday_options(selected_source):
-    df_to_use = processed_dfs[selected_source]
-    # Ensure options are sorted for better UI
-    return [{'label': i, 'value': i} for i in sorted(df_to_use['weekday'].unique(),
-                                                    key=lambda x: ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'].index(x))]
+    counts = load_usage(selected_source)['counts']
+    # Weekdays with data, Monday first
+    return [{'label': day, 'value': day} for w, day in enumerate(WEEKDAYS) if counts[w]]
 
 # Main callback to update graphs
 @callback(
     Output('graph-container', 'children'),
     [Input('data-source-selector', 'value'),
      Input('metric-selector', 'value'),
-     Input('weekday-selector', 'value')]
+     Input('weekday-selector', 'value'),
+     Input('occurrence-selector', 'value')]
 )
-def update_graphs(selected_source, selected_metric, selected_weekday):
-    df_to_plot = processed_dfs[selected_source]
-
-    filtered_df = df_to_plot[df_to_plot['weekday'] == selected_weekday].copy()
-
-    # --- NEW: Calculate the global maximum for the selected metric and weekday ---
-    # Check if filtered_df is empty to avoid error on .max()
-    if filtered_df.empty or selected_metric not in filtered_df.columns:
+@memoize()
+def update_graphs(selected_source, selected_metric, selected_weekday, last_n):
+    tensor = load_usage(selected_source)
+    if selected_metric not in tensor or selected_weekday not in WEEKDAYS:
         return html.Div(f"No data available for {selected_weekday} with {selected_metric} in {selected_source} file.")
+    w = WEEKDAYS.index(selected_weekday)
+    count = int(tensor['counts'][w])
+    if not count:
+        return html.Div(f"No recent data found for {selected_weekday} in {selected_source}.")
 
     # Find the maximum value across all hours for the selected metric on the chosen weekday
     # (across all historical occurrences of that weekday)
-    global_max_y = filtered_df[selected_metric].max()
+    profiles = tensor[selected_metric][w, :count]
+    global_max_y = np.nanmax(profiles) if not np.isnan(profiles).all() else 0
 
     # Add a small buffer for better visualization (e.g., 5-10% more than max)
     ymax_with_buffer = global_max_y * 1.10
     if ymax_with_buffer == 0: # Avoid division by zero or range [0,0] if all values are zero
         ymax_with_buffer = 1 # Set a small default if max is 0
 
-    last_six_dates = sorted(filtered_df['date'].unique(), reverse=True)[:6]
+    # Most recent first
+    dates = tensor['dates'][w, :last_n][:count]
+    profiles = profiles[:last_n]
+    hours = np.arange(24)
+    title = f"{selected_source.capitalize()} {selected_metric.capitalize()}"
 
-    graphs = []
-    if not last_six_dates:
-        return html.Div(f"No recent data found for {selected_weekday} in {selected_source}.")
-
-    for date in last_six_dates:
-        day_df = filtered_df[filtered_df['date'] == date]
-
-        if selected_metric not in day_df.columns:
-            return html.Div(f"Error: Column '{selected_metric}' not found in data for {selected_source}.")
+    if len(dates) > SMALL_MULTIPLES_AFTER:
+        fig = small_multiples(dates, profiles, ymax_with_buffer)
+        fig.update_layout(title=f"{title} on the last {len(dates)} {selected_weekday}s")
+        return [dcc.Graph(figure=fig)]
 
+    graphs = []
+    for date, profile in zip(dates, profiles):
         fig = go.Figure(
-            data=[go.Bar(x=day_df['hour'], y=day_df[selected_metric])],
+            data=[go.Bar(x=hours, y=profile)],
             layout=go.Layout(
-                title=f"{selected_source.capitalize()} {selected_metric.capitalize()} on {date} ({selected_weekday})",
+                title=f"{title} on {date} ({selected_weekday})",
                 xaxis={'title': 'Hour of Day', 'dtick': 1}, # dtick=1 ensures all hours are shown
                 yaxis={'title': selected_metric.capitalize(), 'range': [0, ymax_with_buffer]} # Apply the calculated ymax
             )
@@ -0,0 +1,101 @@
+# --- file: refresh.py ---
+# Concurrent refresh of every data source, used by main.py.
+# Each source runs on its own thread, so the Hilltop fetch (network bound) overlaps with the
+# Genesis CSV ingests, whose parsing (CPU bound) runs in one process pool shared by both
+# usage sources. Within a usage source the stages stay in order: parse, upsert into the
+# stored months, then assign bill months over the merged rows before the commit.
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from data_utils import (INGEST_WORKERS, check_usage_data, check_air_temperature_data,
+                        read_temperature_rollup)
+
+
+def run_tasks(tasks, max_threads=None):
+    """
+    Run tasks on threads as soon as the tasks they depend on have finished.
+
+    Args:
+        tasks (dict): name -> (callable, [names of tasks it depends on]). A callable
+            receives the results of its dependencies as keyword arguments.
+        max_threads (int, optional): Defaults to one thread per task.
+
+    Returns:
+        tuple: (results, timings, errors) dicts keyed by task name. A task whose
+        dependency failed is not run and is reported in errors.
+    """
+    results, timings, errors = {}, {}, {}
+    remaining = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_threads or max(1, len(tasks))) as executor:
+        while remaining or running:
+            for name, (func, deps) in list(remaining.items()):
+                failed = [d for d in deps if d in errors]
+                if failed:
+                    errors[name] = RuntimeError(f"skipped because {', '.join(failed)} failed")
+                    del remaining[name]
+                elif all(d in results for d in deps):
+                    kwargs = {d: results[d] for d in deps}
+                    running[executor.submit(_timed, func, kwargs)] = name
+                    del remaining[name]
+            if not running:
+                # Only tasks whose dependencies can never be met are left
+                for name in remaining:
+                    errors[name] = RuntimeError("unknown or circular dependency")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name], timings[name] = future.result()
+                except Exception as err:
+                    errors[name] = err
+    return results, timings, errors
+
+
+def _timed(func, kwargs):
+    start = time.perf_counter()
+    result = func(**kwargs)
+    return result, time.perf_counter() - start
+
+
+def refresh_all(workers=None):
+    """
+    Refresh electricity, gas and air temperature concurrently.
+
+    Returns:
+        dict: 'electricity' and 'gas' usage frames and the 'air_temperature' hourly rollup.
+
+    Raises:
+        RuntimeError: If any source failed; the others are still committed.
+    """
+    workers = INGEST_WORKERS if workers is None else workers
+    print("Checking all data...")
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if pool is not None:
+            # Start the workers now: forking once the source threads are running could copy
+            # a lock another thread holds
+            pool.submit(int).result()
+        tasks = {
+            'electricity': (lambda: check_usage_data('electricity', workers=workers, executor=pool), []),
+            'gas': (lambda: check_usage_data('gas', workers=workers, executor=pool), []),
+            'air_temperature_fetch': (check_air_temperature_data, []),
+            # Rollups are committed by the fetch, so they are read once it has finished
+            'air_temperature': (lambda air_temperature_fetch: read_temperature_rollup('hourly'),
+                                ['air_temperature_fetch']),
+        }
+        results, timings, errors = run_tasks(tasks)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    print(" + Refresh timings:")
+    for name in tasks:
+        status = f"{timings[name]:.2f} s" if name in timings else f"failed: {errors[name]}"
+        print(f"   - {name:<22} {status}")
+    print(f"   - {'total':<22} {time.perf_counter() - start:.2f} s")
+    if errors:
+        raise RuntimeError(f"Refresh failed for {', '.join(errors)}") from next(iter(errors.values()))
+    print("Data checks complete.")
+    return {name: results[name] for name in ('electricity', 'gas', 'air_temperature')}
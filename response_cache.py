@@ -0,0 +1,145 @@
+# --- file: response_cache.py ---
+# HTTP-level cache for the Dash server.
+# Responses of memoized callbacks (see callback_cache.py) are kept as serialized bytes, keyed
+# on the request body and data_registry.data_version(), and bodies of COMPRESS_BYTES or more
+# are stored pre-compressed (gzip, plus brotli when the package is installed). A repeat
+# request from any browser is answered from those bytes without running Dash. Each stored
+# response carries a strong ETag, and a request sending it back in If-None-Match gets
+# 304 Not Modified. The layout and dependency GETs get ETags too, so a browser reload
+# revalidates them instead of downloading them again.
+#
+#   app = Dash(__name__, use_pages=True)
+#   response_cache.install(app)
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, g, request
+import data_registry
+
+try:
+    import brotli
+except ImportError:
+    # Optional: gzip alone without it
+    brotli = None
+
+RESPONSE_CACHE_MB = float(os.environ.get('RESPONSE_CACHE_MB', 64))
+COMPRESS_BYTES = 1024
+CALLBACK_PATH = '/_dash-update-component'
+STATIC_PATHS = ('/_dash-layout', '/_dash-dependencies')
+
+_ENTRIES = OrderedDict()  # key -> (etags by encoding, bodies by encoding, size)
+_LOCK = threading.Lock()
+_STATS = {'hits': 0, 'misses': 0, 'not_modified': 0, 'bytes': 0, 'version': None}
+
+
+def _encode(payload):
+    bodies = {'identity': payload}
+    if len(payload) >= COMPRESS_BYTES:
+        bodies['gzip'] = gzip.compress(payload, compresslevel=6)
+        if brotli is not None:
+            bodies['br'] = brotli.compress(payload, quality=5)
+    digest = hashlib.sha256(payload).hexdigest()[:32]
+    # Strong validators are per representation, so each encoding has its own
+    etags = {name: digest if name == 'identity' else f"{digest}-{name}" for name in bodies}
+    return etags, bodies
+
+
+def _fill(response, etags, bodies):
+    """Answer from a stored entry: 304 if the client has it, else the best accepted encoding."""
+    response.headers['Vary'] = 'Accept-Encoding'
+    for name, etag in etags.items():
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b'')
+            response.set_etag(etag)
+            with _LOCK:
+                _STATS['not_modified'] += 1
+            return response
+    encoding = next((name for name in ('br', 'gzip') if name in bodies and request.accept_encodings[name]),
+                    'identity')
+    response.set_data(bodies[encoding])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etags[encoding])
+    return response
+
+
+def install(app, max_bytes=None):
+    """
+    Serve app's memoized callbacks from the response cache.
+
+    Args:
+        max_bytes (int, optional): Bound on the stored bytes, all encodings included
+            (default: RESPONSE_CACHE_MB).
+    """
+    max_bytes = max_bytes if max_bytes is not None else int(RESPONSE_CACHE_MB * 2**20)
+    prefix = app.config.requests_pathname_prefix.rstrip('/')
+
+    def cacheable(output):
+        # Memoized callbacks are the ones known to depend only on their inputs and the data
+        callback = app.callback_map.get(output, {}).get('callback')
+        return hasattr(getattr(callback, '__wrapped__', None), 'cache_info')
+
+    @app.server.before_request
+    def serve_cached():
+        if request.method != 'POST' or request.path != prefix + CALLBACK_PATH:
+            return None
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not cacheable(body.get('output')):
+            return None
+        version = data_registry.data_version()
+        key = hashlib.sha256(json.dumps([version, body], sort_keys=True, default=str).encode()).hexdigest()
+        with _LOCK:
+            if version != _STATS['version']:
+                # New data: nothing stored so far can be served again
+                _ENTRIES.clear()
+                _STATS.update(bytes=0, version=version)
+            entry = _ENTRIES.get(key)
+            if entry is None:
+                _STATS['misses'] += 1
+                g.response_cache_key = (key, version)
+                return None
+            _ENTRIES.move_to_end(key)
+            _STATS['hits'] += 1
+        return _fill(Response(mimetype='application/json'), entry[0], entry[1])
+
+    @app.server.after_request
+    def store_response(response):
+        if request.method == 'GET' and request.path in [prefix + path for path in STATIC_PATHS]:
+            if response.status_code == 200:
+                response.add_etag()
+                # Revalidate on every load rather than trusting a stale copy
+                response.headers['Cache-Control'] = 'no-cache'
+                response.make_conditional(request)
+            return response
+        pending = g.pop('response_cache_key', None)
+        # 204 is a prevented update; an encoded body came from elsewhere
+        if pending is None or response.status_code != 200 or response.headers.get('Content-Encoding'):
+            return response
+        key, version = pending
+        etags, bodies = _encode(response.get_data())
+        size = sum(len(body) for body in bodies.values())
+        with _LOCK:
+            # Skip the response if the data moved on while it was computed
+            if size <= max_bytes and _STATS['version'] == version and key not in _ENTRIES:
+                _ENTRIES[key] = (etags, bodies, size)
+                _STATS['bytes'] += size
+                while _STATS['bytes'] > max_bytes:
+                    _, (_, _, evicted) = _ENTRIES.popitem(last=False)
+                    _STATS['bytes'] -= evicted
+        return _fill(response, etags, bodies)
+
+
+def cache_info():
+    with _LOCK:
+        return {'hits': _STATS['hits'], 'misses': _STATS['misses'], 'not_modified': _STATS['not_modified'],
+                'entries': len(_ENTRIES), 'bytes': _STATS['bytes']}
+
+
+def cache_clear():
+    with _LOCK:
+        _ENTRIES.clear()
+        _STATS['bytes'] = 0
@@ -1,10 +1,50 @@
+# --- file: rollback_parquet.py ---
+# List or roll back the ingest generations of the usage stores.
+#   python rollback_parquet.py                   step back one generation (electricity and gas)
+#   python rollback_parquet.py --list            show the retained generations
+#   python rollback_parquet.py --source gas --to 12
+# The processed-file manifest is rolled back with the data, so files ingested after the target
+# generation are picked up again by the next run of main.py unless removed from the data folder.
+import argparse
+import time
+from data_utils import USAGE_SOURCES
+from usage_store import current_generation, list_generations, load_snapshot, rollback
 
-import pandas as pd
-df = pd.read_parquet("electricity_usage.parquet")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll the usage stores back to an earlier ingest.")
+    parser.add_argument("--source", choices=list(USAGE_SOURCES) + ["all"], default="all")
+    parser.add_argument("--to", type=int, help="generation to make current (default: the previous one)")
+    parser.add_argument("--list", action="store_true", help="list retained generations and exit")
+    args = parser.parse_args()
 
-print(df['YYYYMMDD'].max())
+    sources = list(USAGE_SOURCES) if args.source == "all" else [args.source]
+    for source in sources:
+        store = USAGE_SOURCES[source]['store']
+        current = current_generation(store)
+        print(f" + {source} store is at generation {current}")
+        if args.list:
+            for generation in list_generations(store):
+                snapshot = load_snapshot(store, generation)
+                marker = "*" if generation == current else " "
+                print(f"   {marker} {generation:>4}  {snapshot.get('created', ''):19}  "
+                      f"{len(snapshot['partitions'])} partitions, last reading "
+                      f"{snapshot['metadata'].get(f'last_datetime_{source}')}")
+            continue
 
-output_df = df[df['YYYYMMDD'] != df['YYYYMMDD'].max()]
-print(output_df['YYYYMMDD'].max())
-
-output_df.to_parquet("electricity_usage.parquet", index=False)
+        target = args.to
+        if target is None:
+            # The generation the current one was committed on top of
+            target = load_snapshot(store).get("parent") if current is not None else None
+            if target is None:
+                earlier = [g for g in list_generations(store) if current is not None and g < current]
+                target = earlier[-1] if earlier else None
+            if target is None:
+                print("   - No earlier generation to roll back to.")
+                continue
+        start = time.perf_counter()
+        try:
+            rollback(store, target)
+        except ValueError as e:
+            print(f"   - {e}")
+            continue
+        print(f"   - Rolled back to generation {target} in {(time.perf_counter() - start) * 1000:.1f} ms")
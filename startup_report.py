@@ -0,0 +1,100 @@
+# --- file: startup_report.py ---
+# Show where the web app's cold start goes.
+# Imports flask_app in a fresh interpreter with -X importtime, timing each page module as Dash
+# discovers it, then loads every dataset and view in the registry the way the first requests
+# to each page would. Run it from the folder the web app serves from.
+#
+#   python startup_report.py [--top 15] [--no-data]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MARKER = "STARTUP_REPORT "
+
+# Runs in the child interpreter
+CHILD = r'''
+import json, sys, time
+from importlib.machinery import SourceFileLoader
+
+pages = {}
+_exec_module = SourceFileLoader.exec_module
+
+def exec_module(self, module):
+    start = time.perf_counter()
+    _exec_module(self, module)
+    if module.__name__.startswith("pages."):
+        pages[module.__name__[len("pages."):]] = time.perf_counter() - start
+
+SourceFileLoader.exec_module = exec_module
+start = time.perf_counter()
+import flask_app
+total = time.perf_counter() - start
+
+first_use = {}
+if LOAD_DATA:
+    import data_registry
+    for name in data_registry.registered():
+        start = time.perf_counter()
+        try:
+            data_registry.get(name)
+        except (FileNotFoundError, KeyError) as err:
+            print(f"   - {name}: {err}")
+        first_use[name] = time.perf_counter() - start
+
+print(MARKER + json.dumps({"total": total, "pages": pages, "first_use": first_use}))
+'''
+
+
+def parse_importtime(text):
+    """Parse -X importtime output into (module, depth, self seconds, cumulative seconds)."""
+    rows = []
+    for line in text.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def run_child(load_data):
+    code = CHILD.replace("LOAD_DATA", str(load_data)).replace("MARKER", repr(MARKER))
+    # The app folder goes on the path as wsgi.py does; the stores are read from the current folder
+    app_folder = os.path.dirname(os.path.abspath(__file__))
+    code = f"import sys; sys.path.insert(0, {app_folder!r})\n{code}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    report = None
+    for line in result.stdout.splitlines():
+        if line.startswith(MARKER):
+            report = json.loads(line[len(MARKER):])
+        else:
+            print(line)
+    if report is None:
+        sys.exit(f"Importing flask_app failed:\n{result.stderr[-2000:]}")
+    return report, parse_importtime(result.stderr)
+
+
+def print_table(title, rows, top):
+    print(f" + {title}")
+    for name, seconds in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"   {seconds * 1000:8.0f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report where the dashboard's startup time goes.")
+    parser.add_argument("--top", type=int, default=15, help="rows per table (default: %(default)s)")
+    parser.add_argument("--no-data", action="store_true", help="only time the import, not the first data loads")
+    args = parser.parse_args()
+
+    report, imports = run_child(not args.no_data)
+    print(f" + import flask_app: {report['total'] * 1000:.0f} ms")
+    # Depth 1 is everything flask_app and its pages import directly; a module's cost is
+    # charged to whichever importer loads it first
+    print_table("Imports by cumulative time", [(n, c) for n, d, s, c in imports if d == 1], args.top)
+    print_table("Modules by own time", [(n, s) for n, d, s, c in imports], args.top)
+    print_table("Pages (run at discovery, including imports they load first)", report["pages"].items(), args.top)
+    if report["first_use"]:
+        print_table("Data loaded on first use (views exclude the datasets they are built from)",
+                    report["first_use"].items(), args.top)
@@ -0,0 +1,112 @@
+# --- file: usage_cube.py ---
+# Usage and dollar sums at hour, day and month level for the Genesis drill-down pages.
+# Every level is indexed by the start of its period over whole calendar years, with periods
+# that have no readings filled with 0, so drilling down is a slice:
+#   cube['monthly'].loc['2025']                    12 months of 2025
+#   cube['daily'].loc['2025-08']                   every day of August 2025
+#   cube['hourly'].loc['2025-08-05']               24 hours of 5 August 2025
+# update_cube re-aggregates only the months whose store partitions changed since the cube
+# was built; both functions take the registry's usage frame (index, usage, dollars).
+import numpy as np
+import pandas as pd
+
+LEVELS = {'hourly': 'h', 'daily': 'D', 'monthly': 'MS'}
+MEASURES = ['usage', 'dollars']
+
+
+def _hour_sums(df):
+    return df.groupby(df['index'].dt.floor('h'))[MEASURES].sum()
+
+
+def build_cube(df):
+    """Aggregate a usage frame into {'hourly', 'daily', 'monthly', 'partitions'}."""
+    sums = _hour_sums(df)
+    years = sums.index.year if not sums.empty else pd.Index([pd.Timestamp.now().year])
+    hours = pd.date_range(pd.Timestamp(years.min(), 1, 1), pd.Timestamp(years.max() + 1, 1, 1),
+                          freq='h', inclusive='left')
+    hourly = sums.reindex(hours, fill_value=0.0).astype('float64')
+    return {
+        'hourly': hourly,
+        'daily': hourly.resample('D').sum(),
+        'monthly': hourly.resample('MS').sum(),
+        # Partition files the sums came from, for update_cube
+        'partitions': df.attrs.get('partitions'),
+    }
+
+
+def update_cube(cube, df):
+    """
+    Bring cube up to date with df, re-aggregating only the months whose partition files
+    changed. Falls back to build_cube when that can't be told (legacy store) or when a
+    change falls outside the years the cube covers. cube itself is left unchanged.
+    """
+    before, after = cube['partitions'], df.attrs.get('partitions')
+    if before is None or after is None:
+        return build_cube(df)
+    changed = sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+    hourly = cube['hourly']
+    months = pd.PeriodIndex(changed, freq='M')
+    if len(months) and (months.min().start_time < hourly.index[0] or months.max().end_time > hourly.index[-1]):
+        return build_cube(df)
+
+    hourly_values = hourly.to_numpy().copy()
+    daily_values = cube['daily'].to_numpy().copy()
+    monthly_values = cube['monthly'].to_numpy().copy()
+    # Row of the hour grid each reading falls in
+    grid_rows = (df['index'].to_numpy() - hourly.index[0].to_datetime64()) // np.timedelta64(1, 'h')
+    # NaN (e.g. dollars of a reading without cents) counts as 0, as in build_cube's groupby sum
+    readings = np.nan_to_num(df[MEASURES].to_numpy(dtype='float64'))
+    for month in months:
+        start = month.start_time
+        lo, hi = hourly.index.searchsorted(start), hourly.index.searchsorted(month.end_time, side='right')
+        rows = slice(grid_rows.searchsorted(lo), grid_rows.searchsorted(hi))
+        hourly_values[lo:hi] = 0.0
+        np.add.at(hourly_values, grid_rows[rows], readings[rows])
+        # The hour grid has no gaps, so a day is 24 consecutive rows
+        day = lo // 24
+        daily_values[day:day + (hi - lo) // 24] = hourly_values[lo:hi].reshape(-1, 24, len(MEASURES)).sum(axis=1)
+        monthly_values[(start.year - hourly.index[0].year) * 12 + start.month - 1] = hourly_values[lo:hi].sum(axis=0)
+    return {
+        'hourly': pd.DataFrame(hourly_values, index=hourly.index, columns=MEASURES),
+        'daily': pd.DataFrame(daily_values, index=cube['daily'].index, columns=MEASURES),
+        'monthly': pd.DataFrame(monthly_values, index=cube['monthly'].index, columns=MEASURES),
+        'partitions': after,
+    }
+
+
+def build_weekday_tensor(df):
+    """
+    Arrange a usage frame as hour-of-day profiles per weekday, for the weekday history page.
+
+    Returns {'dates', 'counts', 'usage', 'dollars'}: for weekday w (0 = Monday), dates[w, i]
+    is the i-th most recent day on that weekday with readings, counts[w] how many there are,
+    and usage[w, i] / dollars[w, i] the 24 hourly sums of that day (NaN for hours without
+    readings, and for i >= counts[w]). The last n days of a weekday are tensor[metric][w, :n].
+    """
+    timestamp = df['index'].to_numpy()
+    day = timestamp.astype('datetime64[D]')
+    days, day_row = np.unique(day, return_inverse=True)
+    weekday = (days.astype('int64') + 3) % 7  # 1970-01-01 was a Thursday
+    occurrence = np.empty(len(days), dtype=int)
+    counts = np.zeros(7, dtype=int)
+    for w in range(7):
+        # Newest first
+        same = np.flatnonzero(weekday == w)[::-1]
+        occurrence[same] = np.arange(len(same))
+        counts[w] = len(same)
+    depth = max(int(counts.max()), 1) if len(days) else 1
+
+    hour = (timestamp - day).astype('timedelta64[h]').astype(int)
+    cell = (weekday[day_row], occurrence[day_row], hour)
+    filled = np.zeros((7, depth, 24), dtype=bool)
+    filled[cell] = True
+    tensor = {'counts': counts}
+    for measure in MEASURES:
+        sums = np.zeros((7, depth, 24))
+        np.add.at(sums, cell, df[measure].to_numpy(dtype='float64'))
+        sums[~filled] = np.nan
+        tensor[measure] = sums
+    dates = np.full((7, depth), np.datetime64('NaT'), dtype='datetime64[D]')
+    dates[weekday, occurrence] = days
+    tensor['dates'] = dates
+    return tensor
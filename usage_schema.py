@@ -0,0 +1,119 @@
+# --- file: usage_schema.py ---
+# Versioned on-disk schema for the usage stores.
+#
+# Version 1 (the original files) stored every derived field as text next to the readings.
+# Version 2 stores only the reading and its dimensions:
+#   index      datetime64[ns]   start of the hour
+#   usage      float32          kWh
+#   cents      Int32            cost in integer cents
+#   type       category         'actual' / 'estimated'
+#   billMonth  category         billing month name, missing outside the billing windows
+# Calendar fields, dayparts, dollars and units are derived on read by with_derived_fields.
+import calendar
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 2
+SCHEMA_ATTR = "usage_schema_version"
+COMPACT_COLUMNS = ["index", "usage", "cents", "type", "billMonth"]
+BILL_MONTH_DTYPE = pd.CategoricalDtype(list(calendar.month_name)[1:])
+UNITS = "kWh"
+
+# Columns of a version 1 file, in their stored order
+LEGACY_COLUMNS = ["index", "date", "usage", "dollars", "type", "date1", "YYYYMMDD", "Weekday",
+                  "Month", "Year", "d_time", "d_time1", "units", "billMonth"]
+
+
+def schema_version(df):
+    if "cents" in df.columns:
+        return SCHEMA_VERSION
+    return df.attrs.get(SCHEMA_ATTR, 1)
+
+
+def _upgrade_v1(df):
+    bill_month = df["billMonth"] if "billMonth" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    return pd.DataFrame({
+        "index": pd.to_datetime(df["index"]).astype("datetime64[ns]"),
+        "usage": df["usage"].astype("float32"),
+        "cents": (df["dollars"] * 100).round().astype("Int32"),
+        "type": df["type"].astype("category") if "type" in df.columns else pd.Categorical([None] * len(df)),
+        "billMonth": bill_month.astype(object).astype(BILL_MONTH_DTYPE),
+    }, index=df.index)
+
+
+# version -> function upgrading a frame from that version to the next
+UPGRADES = {1: _upgrade_v1}
+
+
+def to_compact(df):
+    """Upgrade a usage frame of any schema version to the current compact schema."""
+    version = schema_version(df)
+    while version < SCHEMA_VERSION:
+        df = UPGRADES[version](df)
+        version += 1
+    df = df[COMPACT_COLUMNS].copy()
+    # Values may have been relabelled or concatenated into plain object columns
+    df["type"] = df["type"].astype("category")
+    df["billMonth"] = df["billMonth"].astype(object).astype(BILL_MONTH_DTYPE)
+    df.attrs[SCHEMA_ATTR] = SCHEMA_VERSION
+    return df
+
+
+def _ordinal(day):
+    return "th" if 11 <= day <= 13 else {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
+
+
+def _date_text(index, with_suffix):
+    # One strftime per distinct day and hour rather than per row
+    days = index.dt.normalize()
+    day_codes, day_uniques = pd.factorize(days)
+    day_text = np.array([f"{d.day}{_ordinal(d.day) if with_suffix else ''} {d.strftime('%B %Y')}"
+                         for d in day_uniques] + [None], dtype=object)
+    return index.dt.strftime("%I:%M%p") + " " + pd.Series(day_text[day_codes], index=index.index)
+
+
+def with_derived_fields(df, fields, daypart_schemes=None):
+    """
+    Add derived columns to a compact frame.
+
+    Args:
+        df (pd.DataFrame): Frame in the current schema.
+        fields (iterable): Any of 'dollars', 'date', 'date1', 'YYYYMMDD', 'Weekday', 'Month',
+            'Year', 'units' or a daypart column registered in daypart_schemes.
+        daypart_schemes (dict, optional): column -> (24 hour codes, categories).
+    """
+    daypart_schemes = daypart_schemes or {}
+    index = df["index"]
+    for field in fields:
+        if field == "dollars":
+            df[field] = df["cents"].astype("float64") / 100
+        elif field == "date":
+            df[field] = _date_text(index, with_suffix=True)
+        elif field == "date1":
+            df[field] = _date_text(index, with_suffix=False)
+        elif field == "YYYYMMDD":
+            df[field] = index.dt.strftime("%Y-%m-%d")
+        elif field == "Weekday":
+            df[field] = index.dt.day_name()
+        elif field == "Month":
+            df[field] = index.dt.month_name()
+        elif field == "Year":
+            df[field] = index.dt.year.astype("int32")
+        elif field == "units":
+            df[field] = pd.Categorical([UNITS] * len(df))
+        elif field in daypart_schemes:
+            codes, categories = daypart_schemes[field]
+            df[field] = pd.Categorical.from_codes(codes[index.dt.hour.to_numpy()], categories=categories,
+                                                  ordered=True)
+        else:
+            raise ValueError(f"Unknown derived usage field: {field}")
+    return df
+
+
+def to_legacy(df, daypart_schemes=None):
+    """Rebuild the version 1 column layout (e.g. for plot_summary) from a compact frame."""
+    missing = [c for c in LEGACY_COLUMNS if c not in df.columns]
+    df = with_derived_fields(df, missing, daypart_schemes)
+    df = df[LEGACY_COLUMNS]
+    df.attrs.pop(SCHEMA_ATTR, None)
+    return df
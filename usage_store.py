@@ -0,0 +1,298 @@
+# --- file: usage_store.py ---
+# Time-partitioned Parquet store: one file per calendar month, so an ingest only rewrites
+# the months it touches.
+#
+# Every write is a transaction that produces a new generation:
+#   <root>/year=YYYY/month=MM/part-<generation>.parquet   immutable partition files
+#   <root>/_snapshots/<generation>.json                   partition map + ingest metadata
+#   <root>/_CURRENT                                       generation readers should use
+# New partition files and the snapshot are written first; replacing _CURRENT (temp file,
+# fsync, rename) is the commit. Readers resolve _CURRENT once and only open files listed in
+# that snapshot, so they never see a half-written file or data that disagrees with its
+# manifest, and need no lock. Writers serialise on <root>/_LOCK.
+# Snapshots are immutable, so rolling back (or forward) to any retained generation only
+# rewrites _CURRENT; new generations are always numbered above every existing one.
+# Stores written before generations existed (<root>/year=YYYY/month=MM/part.parquet) are read
+# as generation 0.
+import os
+import glob
+import json
+import fcntl
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+PARTITION_FILE = "part.parquet"
+SNAPSHOT_DIR = "_snapshots"
+CURRENT_FILE = "_CURRENT"
+LOCK_FILE = "_LOCK"
+# Generations kept for rollback, besides the current one; older ones are pruned on commit
+KEEP_GENERATIONS = int(os.environ.get('STORE_KEEP_GENERATIONS', 30))
+
+# root -> [RLock, depth] so a writer already holding the lock can call write_partitions
+_WRITER_LOCKS = {}
+_WRITER_LOCKS_GUARD = threading.Lock()
+
+
+def partition_keys(timestamps):
+    """Return the 'YYYY-MM' partition key for each timestamp."""
+    return pd.DatetimeIndex(timestamps).strftime("%Y-%m")
+
+
+def _partition_file(key, generation=None):
+    year, month = key.split("-")
+    name = PARTITION_FILE if generation is None else f"part-{generation:06d}.parquet"
+    return os.path.join(f"year={year}", f"month={month}", name)
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path, write):
+    """Call write(tmp_path), fsync the result and rename it over path."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _fsync_dir(directory)
+
+
+def atomic_write_text(path, text):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            f.write(text)
+    _atomic_write(path, write)
+
+
+@contextmanager
+def writer_lock(root):
+    """Hold the store's writer lock; re-entrant within a process."""
+    with _WRITER_LOCKS_GUARD:
+        entry = _WRITER_LOCKS.setdefault(os.path.abspath(root), [threading.RLock(), 0, None])
+    with entry[0]:
+        if entry[1] == 0:
+            os.makedirs(root, exist_ok=True)
+            entry[2] = open(os.path.join(root, LOCK_FILE), "a")
+            fcntl.flock(entry[2], fcntl.LOCK_EX)
+        entry[1] += 1
+        try:
+            yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                fcntl.flock(entry[2], fcntl.LOCK_UN)
+                entry[2].close()
+
+
+def current_generation(root):
+    """Return the committed generation of the store, or None if nothing has been committed."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_path(root, generation):
+    return os.path.join(root, SNAPSHOT_DIR, f"{generation:06d}.json")
+
+
+def load_snapshot(root, generation=None):
+    """
+    Return the snapshot {"generation", "partitions": {key: relative path}, "metadata"} of the
+    given generation, defaulting to the current one.
+    """
+    if generation is None:
+        generation = current_generation(root)
+    if generation is None:
+        # Nothing committed yet: any files come from the layout before generations existed
+        partitions = {}
+        for path in glob.glob(os.path.join(root, "year=*", "month=*", PARTITION_FILE)):
+            month_dir = os.path.dirname(path)
+            year = os.path.basename(os.path.dirname(month_dir)).split("=")[1]
+            month = os.path.basename(month_dir).split("=")[1]
+            partitions[f"{year}-{month}"] = _partition_file(f"{year}-{month}")
+        return {"generation": 0, "partitions": partitions, "metadata": {}}
+    with open(snapshot_path(root, generation)) as f:
+        return json.load(f)
+
+
+def list_generations(root):
+    """Return the sorted generations that still have a snapshot."""
+    paths = glob.glob(os.path.join(root, SNAPSHOT_DIR, "*.json"))
+    return sorted(int(os.path.basename(p).split(".")[0]) for p in paths)
+
+
+def partition_path(root, key, snapshot=None):
+    snapshot = snapshot or load_snapshot(root)
+    return os.path.join(root, snapshot["partitions"][key])
+
+
+def list_partitions(root, snapshot=None):
+    """Return the sorted partition keys of the snapshot (default: current) of root."""
+    snapshot = snapshot or load_snapshot(root)
+    return sorted(snapshot["partitions"])
+
+
+def partitions_between(start, end):
+    """Return the partition keys covering the half-open range [start, end)."""
+    last = pd.Timestamp(end) - pd.Timedelta(1, "ns")
+    if last < pd.Timestamp(start):
+        return []
+    return list(pd.period_range(pd.Timestamp(start), last, freq="M").strftime("%Y-%m"))
+
+
+def read_partitions(root, keys, columns=None, snapshot=None):
+    """Read and concatenate the listed partitions; keys not in the snapshot are skipped."""
+    snapshot = snapshot or load_snapshot(root)
+    files = snapshot["partitions"]
+    frames = [pd.read_parquet(os.path.join(root, files[k]), columns=columns)
+              for k in sorted(set(keys)) if k in files]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def write_partitions(df, root, keys, time_col="index", metadata=None, keep=None):
+    """
+    Commit a new generation in which the partitions listed in keys hold the matching rows
+    of df; all other partitions are carried over unchanged.
+
+    df must hold every row of those partitions, not just the new ones. Partitions left
+    without rows are dropped. metadata (e.g. the processed-file manifest) is committed
+    atomically with the data; by default the previous generation's metadata is kept.
+    The newest keep generations (default KEEP_GENERATIONS) stay available for rollback.
+
+    Returns:
+        int: The committed generation.
+    """
+    with writer_lock(root):
+        base = load_snapshot(root)
+        if current_generation(root) is None and base["partitions"]:
+            # Record the pre-generation layout so it stays readable until superseded
+            commit_snapshot(root, 0, base["partitions"], base["metadata"])
+        # Above any generation left ahead of the current one by a rollback
+        generation = max([base["generation"]] + list_generations(root)) + 1
+        partitions = dict(base["partitions"])
+        row_keys = partition_keys(df[time_col])
+        for key in sorted(set(keys)):
+            part = df[row_keys == key].sort_values(by=time_col)
+            if part.empty:
+                partitions.pop(key, None)
+                continue
+            relative = _partition_file(key, generation)
+            _atomic_write(os.path.join(root, relative), lambda tmp_path: part.to_parquet(tmp_path, index=False))
+            partitions[key] = relative
+        commit_snapshot(root, generation, partitions, base["metadata"] if metadata is None else metadata,
+                        parent=base["generation"])
+        prune_generations(root, KEEP_GENERATIONS if keep is None else keep)
+    return generation
+
+
+def commit_snapshot(root, generation, partitions, metadata, parent=None):
+    """Publish a snapshot and point _CURRENT at it. The caller must hold writer_lock(root)."""
+    snapshot = {"generation": generation, "parent": parent, "partitions": partitions, "metadata": metadata,
+                "created": pd.Timestamp.now().strftime("%Y-%m-%dT%H:%M:%S")}
+    atomic_write_text(snapshot_path(root, generation), json.dumps(snapshot, separators=(",", ":")))
+    set_current(root, generation)
+
+
+def set_current(root, generation):
+    atomic_write_text(os.path.join(root, CURRENT_FILE), str(generation))
+
+
+def rollback(root, generation):
+    """
+    Make a retained generation current again. Only _CURRENT is rewritten, so this takes the
+    same time however much history is kept, and later generations stay available to roll
+    forward to until they are pruned.
+
+    Raises:
+        ValueError: If the generation has been pruned or never existed.
+    """
+    with writer_lock(root):
+        if generation not in list_generations(root):
+            raise ValueError(f"Generation {generation} of {root} is not available "
+                             f"(retained: {list_generations(root)})")
+        set_current(root, generation)
+
+
+def prune_generations(root, keep=KEEP_GENERATIONS):
+    """
+    Delete all but the newest keep generations (the current one is always kept) and any
+    partition file no remaining snapshot references, e.g. left behind by a failed write.
+    The caller must hold writer_lock(root).
+    """
+    generations = list_generations(root)
+    kept = set(generations[-keep:] if keep > 0 else []) | {current_generation(root)}
+    referenced = set()
+    for generation in generations:
+        if generation in kept:
+            referenced.update(load_snapshot(root, generation)["partitions"].values())
+        else:
+            os.remove(snapshot_path(root, generation))
+    for path in glob.glob(os.path.join(root, "year=*", "month=*", "part*.parquet")):
+        if os.path.relpath(path, root) not in referenced:
+            os.remove(path)
+
+
+def read_store(root, start=None, end=None, columns=None, time_col="index", legacy_path=None,
+               generation=None):
+    """
+    Assemble the rows between start and end (inclusive) from the current generation, or
+    from an earlier retained one.
+
+    Only partitions overlapping the range are opened. Falls back to the single-file
+    legacy_path when the store has not been created yet.
+
+    Raises:
+        FileNotFoundError: If neither the store nor the legacy file exists.
+    """
+    snapshot = load_snapshot(root, generation)
+    keys = list_partitions(root, snapshot)
+    if not keys:
+        if legacy_path and os.path.exists(legacy_path):
+            df = pd.read_parquet(legacy_path, columns=columns)
+            return _filter_range(df, start, end, time_col)
+        raise FileNotFoundError(f"No usage data found in {root}")
+
+    if start is not None:
+        keys = [k for k in keys if k >= pd.Timestamp(start).strftime("%Y-%m")]
+    if end is not None:
+        keys = [k for k in keys if k <= pd.Timestamp(end).strftime("%Y-%m")]
+    if columns is not None and time_col not in columns:
+        columns = [time_col] + list(columns)
+
+    df = read_partitions(root, keys, columns=columns, snapshot=snapshot)
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    return _filter_range(df, start, end, time_col)
+
+
+def _filter_range(df, start, end, time_col):
+    if start is not None:
+        df = df[df[time_col] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[time_col] <= pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def migrate_legacy_file(legacy_path, root, time_col="index"):
+    """Split a single-file store into monthly partitions if the store is still empty."""
+    with writer_lock(root):
+        if list_partitions(root) or not os.path.exists(legacy_path):
+            return False
+        print(f"   - Migrating {legacy_path} to partitioned store {root}")
+        df = pd.read_parquet(legacy_path)
+        write_partitions(df, root, partition_keys(df[time_col]).unique(), time_col=time_col)
+    return True